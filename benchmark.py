@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Download pipeline benchmark
+
+Serves synthetic progressive and DASH media from a local HTTP origin and drives
+YouTubeDownloader.download through yt-dlp's generic extractor, so runs are
+reproducible and independent of the network. Reports per-stage timings
+(extract, select, download, merge, postprocess, validate, other), MB/s, peak
+RSS and CPU time as JSON tagged with the git commit, and can compare against a
+previous result file.
+
+Usage:
+    python benchmark.py                      # all scenarios, 32 MB, 3 runs each
+    python benchmark.py --size-mb 128 -o bench.json
+    python benchmark.py --compare bench.json # show deltas against a baseline
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yt_dlp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from youtube_downloader import YouTubeDownloader
+
+# Downloader methods timed as pipeline stages; time spent in nested stages is not double counted
+STAGES = {
+    '_get_video_info': 'extract',
+    '_select_formats': 'select',
+    '_download_separate_streams': 'download',
+    '_ydl_download_with_ssl_fallback': 'download',
+    '_ffmpeg_single_pass': 'merge',
+    '_finalize_audio': 'postprocess',
+    '_validate_and_fix_file': 'validate',
+}
+
+SCENARIOS = {
+    'progressive': {'path': 'progressive.mp4', 'quality': 'best', 'audio_only': False},
+    'dash': {'path': 'manifest.mpd', 'quality': '1080p', 'audio_only': False},
+    'audio': {'path': 'manifest.mpd', 'quality': 'best', 'audio_only': True},
+}
+
+MPD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S"
+     minBufferTime="PT2S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video">
+      <Representation id="video" codecs="avc1.640028" width="1920" height="1080" bandwidth="{video_bw}">
+        <BaseURL>video.mp4</BaseURL>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4" contentType="audio" lang="en">
+      <Representation id="audio" codecs="mp4a.40.2" audioSamplingRate="48000" bandwidth="{audio_bw}">
+        <BaseURL>audio.m4a</BaseURL>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler with Range support and without request logging."""
+
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map,
+                      '.mp4': 'video/mp4', '.m4a': 'audio/mp4', '.mpd': 'application/dash+xml'}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        range_header = self.headers.get('Range')
+        if not range_header or not path.is_file():
+            return super().send_head()
+        size = path.stat().st_size
+        start_s, _, end_s = range_header.replace('bytes=', '').partition('-')
+        start = int(start_s or 0)
+        end = min(int(end_s) if end_s else size - 1, size - 1)
+        if start >= size:
+            self.send_error(416)
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(str(path)))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(256 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class MockOrigin:
+    """Local HTTP origin serving synthetic media of a fixed size."""
+
+    def __init__(self, root: Path, size_mb: float, duration: int = 60):
+        self.root = root
+        self.size = int(size_mb * 1024 * 1024)
+        self.duration = duration
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def _write_random(self, name: str, size: int) -> None:
+        rng = random.Random(name)  # deterministic content across runs
+        with open(self.root / name, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                chunk = min(1024 * 1024, remaining)
+                f.write(rng.randbytes(chunk))
+                remaining -= chunk
+
+    def _write_media(self, name: str, size: int, video: bool, audio: bool) -> None:
+        """Real media via ffmpeg when available (so merge/validate do real work), random bytes otherwise."""
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg:
+            cmd = [ffmpeg, '-y', '-loglevel', 'error']
+            if video:
+                cmd += ['-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={self.duration}']
+            if audio:
+                cmd += ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={self.duration}']
+            if video:
+                bitrate = max(100, int(size * 8 / self.duration / 1000))
+                cmd += ['-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', f'{bitrate}k']
+            if audio:
+                cmd += ['-c:a', 'aac', '-b:a', '128k']
+            result = subprocess.run(cmd + [str(self.root / name)], capture_output=True)
+            if result.returncode == 0:
+                return
+        self._write_random(name, size)
+
+    def start(self) -> str:
+        self._write_media('progressive.mp4', self.size, video=True, audio=True)
+        self._write_media('video.mp4', int(self.size * 0.9), video=True, audio=False)
+        self._write_media('audio.m4a', int(self.size * 0.1), video=False, audio=True)
+        video_bw = int((self.root / 'video.mp4').stat().st_size * 8 / self.duration)
+        audio_bw = int((self.root / 'audio.m4a').stat().st_size * 8 / self.duration)
+        (self.root / 'manifest.mpd').write_text(
+            MPD_TEMPLATE.format(duration=self.duration, video_bw=video_bw, audio_bw=audio_bw))
+
+        root = str(self.root)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), lambda *a: QuietHandler(*a, directory=root))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class StageTimer:
+    """Wraps downloader methods and accumulates exclusive wall time per stage."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def wrap(self, downloader: YouTubeDownloader) -> None:
+        for method, stage in STAGES.items():
+            original = getattr(downloader, method, None)
+            if original is not None:
+                setattr(downloader, method, self._timed(original, stage))
+
+    def _timed(self, func, stage: str):
+        def wrapper(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                self.totals[stage] = self.totals.get(stage, 0.0) + elapsed - nested
+        return wrapper
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    # Include children so ffmpeg/ffprobe work is counted
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(base_url: str, name: str, work_dir: Path) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    out_dir = work_dir / f'out-{name}'
+    shutil.rmtree(out_dir, ignore_errors=True)
+    downloader = YouTubeDownloader(str(out_dir))
+    # Fresh extraction every run so the extract stage is measured
+    YouTubeDownloader._info_cache.clear()
+    timer = StageTimer()
+    timer.wrap(downloader)
+    downloaded = {'bytes': 0}
+
+    def on_progress(d: Dict[str, Any]) -> None:
+        if d.get('status') == 'finished' and not d.get('final'):
+            downloaded['bytes'] += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+    downloader.set_progress_hook(on_progress)
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    success = downloader.download(f"{base_url}/{scenario['path']}", scenario['quality'], 'auto',
+                                  f'bench-{name}', scenario['audio_only'])
+    # Validation runs on a background pool; wait for it so its cost is included
+    downloader.validator._executor.submit(lambda: None).result()
+    wall = time.perf_counter() - start
+    outputs = [p for p in out_dir.iterdir() if p.is_file() and not p.name.startswith('.')] if out_dir.exists() else []
+    size = sum(p.stat().st_size for p in outputs)
+    # Time outside the timed stages: retry backoff, format fallbacks, hook overhead
+    timer.totals['other'] = max(0.0, wall - sum(timer.totals.values()))
+    return {
+        'success': bool(success),
+        'wall_s': round(wall, 4),
+        'cpu_s': round(_cpu_seconds() - cpu_start, 4),
+        'stages_s': {k: round(v, 4) for k, v in sorted(timer.totals.items())},
+        'downloaded_bytes': downloaded['bytes'],
+        'output_bytes': size,
+        'mb_per_s': round(downloaded['bytes'] / (1024 * 1024) / wall, 2) if wall else None,
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of each metric across runs (robust against a single noisy run)."""
+    ok = [r for r in runs if r['success']] or runs
+    stages = sorted({s for r in ok for s in r['stages_s']})
+    return {
+        'runs': len(runs),
+        'successes': sum(r['success'] for r in runs),
+        'wall_s': statistics.median(r['wall_s'] for r in ok),
+        'cpu_s': statistics.median(r['cpu_s'] for r in ok),
+        'mb_per_s': statistics.median(r['mb_per_s'] or 0 for r in ok),
+        'stages_s': {s: round(statistics.median(r['stages_s'].get(s, 0.0) for r in ok), 4) for s in stages},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\nComparison: {baseline.get('commit')} -> {current.get('commit')}")
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        print(f"  {name}:")
+        rows = [('wall_s', result['wall_s'], base['wall_s']), ('cpu_s', result['cpu_s'], base['cpu_s']),
+                ('mb_per_s', result['mb_per_s'], base['mb_per_s'])]
+        rows += [(f'stage.{s}', v, base['stages_s'].get(s)) for s, v in result['stages_s'].items()]
+        for label, now, before in rows:
+            if before:
+                print(f"    {label:<22} {before:>10.3f} -> {now:>10.3f}  ({(now - before) / before * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the download pipeline against a local mock origin')
+    parser.add_argument('--size-mb', type=float, default=32, help='Size of the synthetic media (default: 32)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario (default: 3)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    if 'dash' in names and not shutil.which('ffmpeg'):
+        # Separate streams cannot be merged without ffmpeg; the run would only measure retries
+        print("skipping 'dash': ffmpeg not found")
+        names.remove('dash')
+
+    with tempfile.TemporaryDirectory(prefix='ytdl-bench-') as tmp:
+        work_dir = Path(tmp)
+        origin_dir = work_dir / 'origin'
+        origin_dir.mkdir()
+        origin = MockOrigin(origin_dir, args.size_mb)
+        base_url = origin.start()
+        results = {}
+        try:
+            for name in names:
+                runs = [run_scenario(base_url, name, work_dir) for _ in range(args.repeat)]
+                results[name] = {**summarize(runs), 'samples': runs}
+                r = results[name]
+                print(f"{name:<12} ok {r['successes']}/{r['runs']}  wall {r['wall_s']:.3f}s  "
+                      f"cpu {r['cpu_s']:.3f}s  {r['mb_per_s']:.1f} MB/s  stages {r['stages_s']}")
+        finally:
+            origin.stop()
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'ffmpeg': bool(shutil.which('ffmpeg')),
+        'size_mb': args.size_mb,
+        'peak_rss_mb': _peak_rss_mb(),
+        'scenarios': results,
+    }
+    print(f"peak RSS {report['peak_rss_mb']} MB, commit {report['commit']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Tests for the download pipeline building blocks (toolchain, validation, finalization)
+"""
+
+import os
+import sys
+import stat
+from pathlib import Path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import youtube_downloader
+from youtube_downloader import (ToolchainRegistry, ValidationPipeline, OutputFinalizer, ThumbnailCache,
+                                StorageManager, YouTubeDownloader, configure_logging, job_context)
+
+FAKE_FFMPEG = """#!/bin/sh
+echo call >> "{calls}"
+case "$*" in
+  *-version*) echo "ffmpeg version 6.1-test Copyright (c) 2000-2023" ;;
+  *-encoders*) printf 'Encoders:\\n V..... = Video\\n ------\\n V....D libx264   H.264\\n V....D h264_nvenc NVENC\\n A....D aac   AAC\\n' ;;
+  *-muxers*) printf 'File formats:\\n E = Muxing supported\\n --\\n  E mp4    MP4\\n  E matroska,webm  Matroska\\n' ;;
+  *-hwaccels*) printf 'Hardware acceleration methods:\\ncuda\\nvaapi\\n' ;;
+esac
+"""
+
+
+def _make_toolchain(directory, calls):
+    ffmpeg = directory / 'ffmpeg'
+    ffmpeg.write_text(FAKE_FFMPEG.format(calls=calls))
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    ffprobe = directory / 'ffprobe'
+    ffprobe.write_text('#!/bin/sh\n')
+    ffprobe.chmod(ffprobe.stat().st_mode | stat.S_IEXEC)
+    return ffmpeg, ffprobe
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='uses a POSIX shell script as fake ffmpeg')
+def test_toolchain_registry_caches_and_invalidates(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'opt' / 'ffmpeg' / 'bin'
+    bin_dir.mkdir(parents=True)
+    calls = tmp_path / 'calls.txt'
+    ffmpeg, ffprobe = _make_toolchain(bin_dir, calls)
+    monkeypatch.setattr(ToolchainRegistry, '_ffmpeg_candidates', staticmethod(lambda: [str(ffmpeg)]))
+    cache = tmp_path / 'toolchain.json'
+
+    toolchain = ToolchainRegistry(str(cache)).get()
+    assert toolchain['ffmpeg'] == str(ffmpeg)
+    # ffprobe is found next to ffmpeg, not by string replacement on the path
+    assert toolchain['ffprobe'] == str(ffprobe)
+    assert toolchain['version'] == '6.1-test'
+    assert 'libx264' in toolchain['encoders'] and 'webm' in toolchain['muxers']
+    assert toolchain['hwaccels'] == ['cuda', 'vaapi']
+    probes = len(calls.read_text().splitlines())
+
+    # A second registry (e.g. another worker process) reuses the persisted result
+    registry = ToolchainRegistry(str(cache))
+    assert registry.get()['version'] == '6.1-test'
+    assert registry.hardware_encoders() == ['h264_nvenc']
+    assert len(calls.read_text().splitlines()) == probes
+
+    # Replacing the binary invalidates the cache entry
+    ffmpeg.write_text(FAKE_FFMPEG.format(calls=calls) + '\n# upgraded\n')
+    os.utime(ffmpeg, ns=(0, 10 ** 9))
+    ToolchainRegistry(str(cache)).get()
+    assert len(calls.read_text().splitlines()) == probes * 2
+
+
+def test_validation_probe_cache_and_remux_only_on_failure(tmp_path, monkeypatch):
+    media = tmp_path / 'clip.mp4'
+    media.write_bytes(b'x' * 64)
+    probes = []
+    remuxes = []
+
+    def fake_probe(path):
+        probes.append(path)
+        return {'duration': 12.0, 'width': 640, 'height': 360, 'vcodec': 'h264', 'acodec': 'aac'}
+
+    downloader = YouTubeDownloader(str(tmp_path))
+    downloader.validator = ValidationPipeline(max_workers=1)
+    monkeypatch.setattr(downloader, '_ffprobe', fake_probe)
+    monkeypatch.setattr(downloader, '_remux_to_mp4', lambda src, dst: remuxes.append(src) or False)
+
+    result = downloader.validator.submit(str(media), downloader._validate_and_fix_file).result(timeout=5)
+    assert result['media_info']['width'] == 640
+    downloader._validate_and_fix_file(str(media))
+    assert len(probes) == 1 and not remuxes
+
+    # Changing the file invalidates the cached probe; a failed check triggers the remux
+    media.write_bytes(b'y' * 128)
+    monkeypatch.setattr(downloader, '_ffprobe', lambda path: {'duration': 0, 'width': 0, 'vcodec': 'h264'})
+    downloader._validate_and_fix_file(str(media))
+    assert remuxes == [str(media)]
+
+
+def test_output_finalizer_atomic_commit_and_backup_policy(tmp_path):
+    original = tmp_path / 'clip.webm'
+    target = tmp_path / 'clip.mp4'
+
+    finalizer = OutputFinalizer(backup_policy='none')
+    original.write_bytes(b'old')
+    with finalizer.staging(target) as tmp:
+        assert tmp.parent == target.parent and tmp.suffix == '.mp4'
+        tmp.write_bytes(b'new')
+        finalizer.commit(tmp, target, replaces=original)
+    # Exactly one copy of the final bytes, no temp files or backups left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['clip.mp4']
+    assert target.read_bytes() == b'new'
+
+    # An uncommitted staging file is cleaned up
+    with finalizer.staging(target) as tmp:
+        tmp.write_bytes(b'partial')
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['clip.mp4']
+
+    keeper = OutputFinalizer(backup_policy='keep', retention=3600)
+    with keeper.staging(target) as tmp:
+        tmp.write_bytes(b'newer')
+        keeper.commit(tmp, target, replaces=target)
+    backup = tmp_path / 'clip.mp4.orig'
+    assert backup.read_bytes() == b'new' and target.read_bytes() == b'newer'
+    os.utime(backup, (0, 0))
+    assert keeper.prune_backups(tmp_path) == 1 and not backup.exists()
+
+
+def test_single_pass_postprocess_runs_ffmpeg_once(tmp_path, monkeypatch):
+    import subprocess
+    video, audio = tmp_path / 'video.mp4', tmp_path / 'audio.m4a'
+    video.write_bytes(b'v')
+    audio.write_bytes(b'a')
+    output = tmp_path / 'out' / 'Title.mp4'
+    output.parent.mkdir()
+    thumb = tmp_path / 'cover.jpg'
+    commands = []
+
+    def fake_run(cmd, **kwargs):
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b'merged')
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+
+    def fake_thumbnail(info):
+        thumb.write_bytes(b'jpg')
+        return str(thumb)
+
+    downloader = YouTubeDownloader(str(tmp_path))
+    downloader.merger.ffmpeg_path = 'ffmpeg'
+    monkeypatch.setattr(downloader, '_fetch_thumbnail', fake_thumbnail)
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+
+    info = {'title': 'Title', 'uploader': 'Someone', 'vcodec': 'avc1'}
+    assert downloader._ffmpeg_single_pass([str(video), str(audio)], output, info)
+    assert len(commands) == 1
+    cmd = commands[0]
+    assert cmd[cmd.index('-movflags') + 1] == '+faststart'
+    assert 'attached_pic' in cmd and 'title=Title' in cmd and 'artist=Someone' in cmd
+    # Only the final output remains, no temp file
+    assert sorted(p.name for p in output.parent.iterdir()) == ['Title.mp4']
+
+
+def test_audio_copy_first_and_explicit_transcode(tmp_path, monkeypatch):
+    calls = []
+    downloader = YouTubeDownloader(str(tmp_path))
+    monkeypatch.setattr(downloader, '_ffmpeg_single_pass',
+                        lambda inputs, output, info, audio_only=False, audio_encoder=None:
+                        calls.append((output.suffix, audio_encoder)) or True)
+    source = tmp_path / 'song.webm'
+
+    # Default: keep the opus stream, remux into its native container without an encoder
+    assert downloader._finalize_audio(source, {'acodec': 'opus'}).suffix == '.opus'
+    assert downloader._finalize_audio(source, {'acodec': 'mp4a.40.2'}).suffix == '.m4a'
+    assert calls == [('.opus', None), ('.m4a', None)]
+
+    # Transcoding only happens when a target codec is requested
+    downloader.audio_format = 'mp3'
+    assert downloader._finalize_audio(source, {'acodec': 'opus'}).suffix == '.mp3'
+    assert calls[-1] == ('.mp3', 'libmp3lame')
+    downloader.audio_format = 'aac'
+    downloader._finalize_audio(source, {'acodec': 'mp4a.40.2'})
+    assert calls[-1] == ('.m4a', None)
+
+
+def test_thumbnail_cache_fetches_once_and_evicts_lru(tmp_path, monkeypatch):
+    fetched = []
+    image = b'\xff\xd8' + b'j' * 398
+
+    def fake_fetch(url):
+        fetched.append(url)
+        return image
+
+    monkeypatch.setattr(ThumbnailCache, '_fetch', staticmethod(fake_fetch))
+    cache = ThumbnailCache(str(tmp_path), max_bytes=1000)
+
+    first = cache.get('vid1', 'https://img.example/vid1.jpg')
+    assert first.suffix == '.jpg' and ThumbnailCache.content_type(first) == 'image/jpeg'
+    assert cache.get('vid1') == first and len(fetched) == 1
+
+    cache.get('vid2', 'https://img.example/vid2.jpg')
+    cache.get('vid1')  # vid1 becomes most recently used
+    cache.get('vid3', 'https://img.example/vid3.jpg')
+    assert cache.lookup('vid2') is None and cache.lookup('vid1') and cache.lookup('vid3')
+
+    # An evicted image is fetched again from its remembered origin URL
+    assert cache.get('vid2') is not None
+    assert fetched[-1] == 'https://img.example/vid2.jpg'
+
+
+def test_storage_manager_evicts_lru_and_sweeps_orphans(tmp_path):
+    for name in ('old.mp4', 'pinned.mp4', 'served.mp4', 'recent.mp4'):
+        (tmp_path / name).write_bytes(b'x' * 100)
+    for name in ('crashed.mp4.part', '.clip.1-2.ytdl-tmp.mp4', 'live.mp4.part'):
+        (tmp_path / name).write_bytes(b'p')
+        os.utime(tmp_path / name, (0, 0))
+    staging_root = tmp_path / 'staging'
+    (staging_root / 'ytdl-dead').mkdir(parents=True)
+    os.utime(staging_root / 'ytdl-dead', (0, 0))
+
+    storage = StorageManager(str(tmp_path), quota_bytes=400, high_watermark=0.9, low_watermark=0.5)
+    storage.staging_roots = [staging_root]
+    storage.set_protected(lambda: [str(tmp_path / 'live.mp4.part')])
+    storage.touch(tmp_path / 'old.mp4')
+    storage.touch(tmp_path / 'recent.mp4')
+    storage.pin(tmp_path / 'pinned.mp4')
+    storage.acquire(tmp_path / 'served.mp4')
+
+    result = storage.run_once()
+    assert sorted(result['orphans_removed'][:2]) == ['.clip.1-2.ytdl-tmp.mp4', 'crashed.mp4.part']
+    assert not (staging_root / 'ytdl-dead').exists() and (tmp_path / 'live.mp4.part').exists()
+    # Least recently accessed goes first; pinned and in-flight files survive
+    assert result['evicted'] == ['old.mp4', 'recent.mp4']
+    assert (tmp_path / 'pinned.mp4').exists() and (tmp_path / 'served.mp4').exists()
+
+    storage.release(tmp_path / 'served.mp4')
+    status = StorageManager(str(tmp_path), quota_bytes=400).status()
+    assert [f['filename'] for f in status['files'] if f['pinned']] == ['pinned.mp4']
+
+
+def test_admission_estimate_and_reservation(tmp_path):
+    downloader = YouTubeDownloader(str(tmp_path / 'out'))
+    downloader.merger.ffmpeg_available = True
+    info = {'duration': 100, 'formats': [
+        {'format_id': 'a', 'acodec': 'opus', 'vcodec': 'none', 'abr': 128, 'filesize': 1000},
+        {'format_id': 'v720', 'acodec': 'none', 'vcodec': 'vp9', 'height': 720, 'filesize': 4000},
+        {'format_id': 'v1080', 'acodec': 'none', 'vcodec': 'vp9', 'height': 1080, 'filesize_approx': 9000},
+    ]}
+    # Sources and the merged output coexist: about twice the selected streams
+    assert downloader.estimate_required_bytes(info, '1080p') == int(10000 * 2 * 1.05)
+    assert downloader.estimate_required_bytes(info, '720p') == int(5000 * 2 * 1.05)
+    assert downloader.estimate_required_bytes(info, audio_only=True) == int(1000 * 2 * 1.05)
+    assert downloader.estimate_required_bytes({'formats': [{'vcodec': 'h264'}]}) is None
+
+    storage = StorageManager(str(tmp_path), quota_bytes=1000, high_watermark=1.0, low_watermark=0.5)
+    assert storage.reserve('job-1', 600)
+    queued = []
+    assert not storage.reserve('job-2', 600, timeout=0.1, on_wait=lambda: queued.append(True))
+    assert queued == [True]
+    with pytest.raises(OSError):
+        storage.reserve('job-3', 5000)
+    storage.release_reservation('job-1')
+    assert storage.reserve('job-2', 600, timeout=0.1)
+
+
+def test_staging_placement_by_size(tmp_path):
+    ram = tmp_path / 'shm'
+    ram.mkdir()
+    storage = StorageManager(str(tmp_path / 'downloads'))
+    storage.ram_staging_dir = ram
+    storage.ram_staging_max = 1024 * 1024
+
+    assert storage.staging_root(4096) == ram
+    # Large or unknown-size jobs stage next to the output so the final step is a rename
+    on_disk = tmp_path / 'downloads' / '.staging'
+    assert storage.staging_root(10 * 1024 * 1024) == on_disk
+    assert storage.staging_root(None) == on_disk
+    with storage.staging_dir(None) as staging:
+        assert Path(staging).parent == on_disk and Path(staging).name.startswith('ytdl-')
+
+
+def test_logging_json_job_id_and_quiet(monkeypatch):
+    import io
+    import json
+    import logging
+    monkeypatch.delenv('YTDL_LOG_LEVELS', raising=False)
+    out = io.StringIO()
+    configure_logging('DEBUG', 'json', stream=out)
+    try:
+        with job_context('job-42'):
+            pool = ValidationPipeline(max_workers=1)
+            # Work handed to the validation pool keeps the submitting job's ID
+            pool.submit('x', lambda name: youtube_downloader.logger.info('validating %s', name)).result(timeout=5)
+        youtube_downloader.logger.debug('idle')
+    finally:
+        youtube_downloader._stop_log_listener()
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r['job_id'], r['msg']) for r in records] == [('job-42', 'validating x'), ('-', 'idle')]
+
+    configure_logging(quiet=True, stream=io.StringIO())
+    try:
+        assert not youtube_downloader.logger.isEnabledFor(logging.INFO)
+    finally:
+        youtube_downloader._stop_log_listener()
+        logging.getLogger('ytdl').setLevel(logging.NOTSET)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
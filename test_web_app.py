@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the web interface endpoints
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import web_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'downloads').mkdir()
+    monkeypatch.setattr(web_app, 'active_downloads', {})
+    monkeypatch.setattr(web_app, 'completed_downloads', {})
+    web_app.app.config['TESTING'] = True
+    with web_app.app.test_client() as test_client:
+        yield test_client
+
+
+def _completed_job(tmp_path, name='clip.mp4', data=b'0123456789' * 100):
+    path = tmp_path / 'downloads' / name
+    path.write_bytes(data)
+    record = {'status': 'completed', 'filename': name, 'file_path': str(path)}
+    web_app.completed_downloads['job-1'] = record
+    return record
+
+
+def test_download_file_etag_conditional_and_range(client, tmp_path):
+    record = _completed_job(tmp_path)
+
+    full = client.get('/api/download/job-1/file')
+    assert full.status_code == 200 and len(full.data) == 1000
+    etag = full.headers['ETag']
+    assert record['etag'] == etag.strip('"')
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert 'Access-Control-Allow-Origin' not in full.headers
+
+    assert client.get('/api/download/job-1/file', headers={'If-None-Match': etag}).status_code == 304
+
+    partial = client.get('/api/download/job-1/file', headers={'Range': 'bytes=10-19'})
+    assert partial.status_code == 206
+    assert partial.data == b'0123456789'
+    assert partial.headers['Content-Range'] == 'bytes 10-19/1000'
+
+    head = client.head('/api/download/job-1/file')
+    assert head.status_code == 200 and head.data == b''
+    assert head.headers['Content-Length'] == '1000'
+
+
+def test_download_file_accel_redirect(client, tmp_path, monkeypatch):
+    _completed_job(tmp_path, name='my clip.mp4')
+    monkeypatch.setitem(web_app.app.config, 'ACCEL_REDIRECT_PREFIX', '/protected/')
+
+    response = client.get('/api/download/job-1/file')
+    assert response.headers['X-Accel-Redirect'] == '/protected/my%20clip.mp4'
+    assert 'X-Sendfile' not in response.headers
+    assert response.data == b''
+
+
+def test_stream_follows_part_file_and_rejects_sequential(client, tmp_path):
+    part = tmp_path / 'downloads' / 'clip.mp4.part'
+    part.write_bytes(b'abc' * 10)
+    job = {'status': 'downloading', 'download_id': 'job-2'}
+    web_app.active_downloads['job-2'] = job
+    web_app.WebDownloader._track_stream_part(job, {
+        'status': 'finished', 'tmpfilename': str(part), 'filename': str(part)[:-5], 'total_bytes': 30})
+
+    response = client.get('/api/download/job-2/stream')
+    assert response.status_code == 200 and response.data == b'abc' * 10
+    assert response.headers['Content-Length'] == '30'
+    assert response.headers['X-Progressive-Download'] == 'single'
+
+    job['delivery'] = 'sequential'
+    rejected = client.get('/api/download/job-2/stream')
+    assert rejected.status_code == 409 and rejected.headers['Retry-After']
+
+
+def test_metrics_endpoint_exports_spans_counters_and_gauges(client, tmp_path):
+    _completed_job(tmp_path)
+    web_app.active_downloads['job-3'] = {'status': 'queued'}
+    client.get('/api/download/job-1/file')
+    with web_app.metrics.span('extract'):
+        pass
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE ytdl_stage_duration_seconds histogram' in body
+    assert 'ytdl_stage_duration_seconds_bucket{stage="extract",le="+Inf"}' in body
+    assert 'ytdl_files_served_total{proxied="no"}' in body
+    assert 'ytdl_queue_depth 1' in body
+    assert 'ytdl_active_jobs{status="queued"} 1' in body
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -12,7 +12,10 @@ Features:
 """
 
 import os
+import re
 import json
+import logging
+import mimetypes
 import threading
 import sys
 import uuid
@@ -27,17 +30,37 @@ from pathlib import Path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from flask import Flask, render_template, request, jsonify, send_file, make_response, Response
+from werkzeug.utils import send_file as werkzeug_send_file
+from urllib.parse import quote, unquote
 import time
 
-from youtube_downloader import YouTubeDownloader
+from youtube_downloader import (YouTubeDownloader, ThumbnailCache, MetricsRegistry, configure_logging,
+                                job_context)
+
+logger = logging.getLogger('ytdl.web')
 
 # Initialize Flask app with optimized configuration
 app = Flask(__name__)
 
 # SSE: Stream download progress updates
+# Open SSE connections, exported on /metrics
+sse_subscribers = 0
+sse_subscribers_lock = threading.Lock()
+
+
 @app.route('/api/progress_sse/<download_id>')
 def progress_sse(download_id: str):
     def event_stream():
+        global sse_subscribers
+        with sse_subscribers_lock:
+            sse_subscribers += 1
+        try:
+            yield from watch()
+        finally:
+            with sse_subscribers_lock:
+                sse_subscribers -= 1
+
+    def watch():
         last_progress = None
         while True:
             if download_id in active_downloads:
@@ -82,6 +105,10 @@ app.config.update(
     MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16MB max
     JSON_SORT_KEYS=False,
     JSONIFY_PRETTYPRINT_REGULAR=False,  # Optimize JSON responses
+    # File delivery: cross-origin access and reverse-proxy offload are opt-in
+    CORS_ALLOW_ORIGIN=os.environ.get('YTDL_CORS_ORIGIN'),
+    ACCEL_REDIRECT_PREFIX=os.environ.get('YTDL_ACCEL_REDIRECT_PREFIX'),
+    USE_X_SENDFILE=os.environ.get('YTDL_X_SENDFILE') == '1',
 )
 
 # Global variables for tracking downloads (optimized structure)
@@ -113,37 +140,54 @@ class WebDownloader(YouTubeDownloader):
         # Set up progress callback
         self.set_progress_hook(self._web_progress_hook)
     
+    @staticmethod
+    def _track_stream_part(download_info: Dict[str, Any], d: Dict[str, Any]) -> None:
+        """Remember where each stream is being written so it can be delivered while downloading."""
+        stream = d.get('stream') or 'main'
+        if stream != 'main':
+            download_info['delivery'] = 'merged'
+        elif (d.get('info_dict') or {}).get('requested_formats'):
+            # yt-dlp fetches the formats one after another and merges at the end
+            download_info['delivery'] = 'sequential'
+        else:
+            download_info.setdefault('delivery', 'single')
+        part = download_info.setdefault('stream_parts', {}).setdefault(stream, {})
+        part['tmpfilename'] = d.get('tmpfilename') or part.get('tmpfilename')
+        part['filename'] = d.get('filename') or part.get('filename')
+        if d.get('total_bytes'):
+            part['total_bytes'] = d['total_bytes']
+        part['done'] = d['status'] == 'finished'
+
     def _web_progress_hook(self, d: Dict[str, Any]) -> None:
         """Optimized progress hook for web interface."""
+        if d.get('status') == 'validated':
+            # Reported from the validation pool, possibly after the job has completed
+            record = completed_downloads.get(d.get('download_id')) or active_downloads.get(d.get('download_id'))
+            if record is not None:
+                record['media_info'] = d.get('media_info', {})
+                if d.get('filename') and record.get('file_path') and d['filename'] != record['file_path']:
+                    record['file_path'] = d['filename']
+                    record['filename'] = Path(d['filename']).name
+            return
         if not self.download_id or self.download_id not in active_downloads:
             return
         download_info = active_downloads[self.download_id]
         try:
+            if d['status'] in ('downloading', 'finished') and not d.get('final'):
+                self._track_stream_part(download_info, d)
             if d['status'] == 'downloading':
                 download_info['status'] = 'downloading'
                 download_info['downloaded_bytes'] = d.get('downloaded_bytes', 0)
                 # Propagate audio_only flag for frontend
                 if hasattr(self, 'audio_only'):
                     download_info['audio_only'] = self.audio_only
+                download_info['speed'] = d.get('speed') or 0
                 if 'total_bytes' in d and d['total_bytes']:
                     download_info['total_bytes'] = d['total_bytes']
                     download_info['progress'] = (d['downloaded_bytes'] / d['total_bytes']) * 100
             elif d['status'] == 'finished':
-                # Check if this is just a segment finishing or the entire download
-                if 'fragment_index' in d or 'fragment_count' in d:
-                    # This is just a fragment/segment finishing, not the entire download
-                    return
-                
-                # For video downloads, don't mark as complete if this is just audio finishing
-                # Check if filename suggests this is just one part of a multi-part download
-                filename = d.get('filename', '')
-                # Check if this is a temp file (indicating separate stream download)
-                is_temp_file = 'temp' in filename.lower() or 'tmp' in filename.lower()
-                is_partial_stream = ('audio' in filename.lower() or 'video' in filename.lower() or 
-                                   filename.endswith('.webm') or filename.endswith('.m4a') or is_temp_file)
-                
-                if (not getattr(self, 'audio_only', False) and is_partial_stream):
-                    # This is likely just audio/video portion finishing, not complete download
+                if not d.get('final'):
+                    # A stream/fragment finished; merging and postprocessing are still to run
                     download_info['status'] = 'processing'
                     return
                 
@@ -161,14 +205,46 @@ class WebDownloader(YouTubeDownloader):
                 # Move to completed downloads only when truly finished
                 completed_downloads[self.download_id] = download_info.copy()
                 del active_downloads[self.download_id]
-        except Exception as e:
-            print(f'[ERROR] Exception in _web_progress_hook: {e}')
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception('Exception in _web_progress_hook')
 
 
 # Global downloader instance
 downloader = WebDownloader()
+storage = downloader.storage
+
+
+def _active_job_paths():
+    """Files owned by running jobs; the storage manager never sweeps or evicts them."""
+    for job in list(active_downloads.values()):
+        yield job.get('file_path')
+        for part in job.get('stream_parts', {}).values():
+            yield part.get('tmpfilename')
+            yield part.get('filename')
+
+
+storage.set_protected(lambda: list(_active_job_paths()))
+
+metrics = MetricsRegistry.shared()
+
+
+def _jobs_by_status() -> Dict[tuple, int]:
+    counts: Dict[tuple, int] = {}
+    for job in list(active_downloads.values()):
+        key = (('status', job.get('status', 'unknown')),)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+metrics.register_gauge('ytdl_active_jobs', 'Jobs that have not finished yet, by status', _jobs_by_status)
+metrics.register_gauge('ytdl_queue_depth', 'Jobs waiting for admission (disk space)',
+                       lambda: sum(1 for job in list(active_downloads.values()) if job.get('status') == 'queued'))
+metrics.register_gauge('ytdl_download_bytes_per_second', 'Current aggregate download speed',
+                       lambda: sum(job.get('speed') or 0 for job in list(active_downloads.values())
+                                   if job.get('status') == 'downloading'))
+metrics.register_gauge('ytdl_sse_subscribers', 'Open progress event streams', lambda: sse_subscribers)
+metrics.register_gauge('ytdl_storage_used_bytes', 'Bytes used in the downloads directory',
+                       lambda: storage.status()['used_bytes'])
 
 # Security helper functions
 def validate_safe_path(requested_path: str, base_dir: Path) -> Optional[Path]:
@@ -240,7 +316,7 @@ def get_video_info():
         
         def get_info_thread():
             try:
-                print(f"[DEBUG] Getting video info for URL: {url}")
+                logger.debug("Getting video info for URL: %s", url)
                 # Temporarily set insecure flag for this downloader
                 prev_insecure = getattr(downloader, 'insecure_ssl', False)
                 try:
@@ -248,9 +324,9 @@ def get_video_info():
                     info_result[0] = downloader.get_video_info(url)
                 finally:
                     downloader.insecure_ssl = prev_insecure
-                print(f"[DEBUG] Video info retrieved successfully")
+                logger.debug("Video info retrieved successfully")
             except Exception as e:
-                print(f"[DEBUG] Error in get_info_thread: {e}")
+                logger.warning("Error in get_info_thread: %s", e)
                 error_result[0] = str(e)
         
         thread = threading.Thread(target=get_info_thread, daemon=True)
@@ -273,13 +349,22 @@ def get_video_info():
             resp.headers['Content-Type'] = 'application/json; charset=utf-8'
             return resp
             
+        # Serve the thumbnail from the local cache; warm it now so the preview and
+        # the cover embedding later on share a single origin fetch
+        thumbnail_url = info.get('thumbnail') or ''
+        thumb_key = downloader.thumbnails.remember(info.get('id'), thumbnail_url) if thumbnail_url else None
+        if thumb_key:
+            threading.Thread(target=downloader.thumbnails.get, args=(info.get('id'), thumbnail_url),
+                             daemon=True).start()
+
         # Extract and optimize video information
         video_info = {
             'title': info.get('title', 'Unknown'),
             'duration': info.get('duration_string', 'Unknown'),
             'uploader': info.get('uploader', 'Unknown'),
             'view_count': info.get('view_count', 0),
-            'thumbnail': info.get('thumbnail', ''),
+            'thumbnail': f'/api/thumbnail/{thumb_key}' if thumb_key else '',
+            'thumbnail_origin': thumbnail_url,
         }
         # Extract available qualities efficiently with improved resolution detection
         formats = info.get('formats', [])
@@ -328,9 +413,12 @@ def get_video_info():
                     audio_languages[lang_code] = lang_name
         
         # Debug: Print found resolutions and formats for troubleshooting
-        print(f"DEBUG: Found resolutions: {sorted(found_resolutions, reverse=True)}")
-        print(f"DEBUG: Available qualities: {sorted(qualities, key=lambda x: {'4K': 2160, '1440p': 1440, '1080p': 1080, '720p': 720, '480p': 480, '360p': 360, '240p': 240, '144p': 144}.get(x, 0), reverse=True)}")
-        print(f"DEBUG: Available audio languages: {audio_languages}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Found resolutions: %s", sorted(found_resolutions, reverse=True))
+            logger.debug("Available qualities: %s", sorted(qualities, key=lambda x: {
+                '4K': 2160, '1440p': 1440, '1080p': 1080, '720p': 720, '480p': 480, '360p': 360,
+                '240p': 240, '144p': 144}.get(x, 0), reverse=True))
+            logger.debug("Available audio languages: %s", audio_languages)
         
         # Sort qualities by resolution
         quality_order = {'4K': 2160, '1440p': 1440, '1080p': 1080, '720p': 720, '480p': 480, '360p': 360, '240p': 240, '144p': 144}
@@ -357,6 +445,40 @@ def get_video_info():
         resp.headers['Content-Type'] = 'application/json; charset=utf-8'
         return resp
 
+@app.route('/api/thumbnail/<thumb_key>')
+def get_thumbnail(thumb_key: str):
+    """Serve a cached thumbnail; images are immutable per video ID, so cache them long-term."""
+    if not re.fullmatch(r'[\w-]{1,128}', thumb_key):
+        return jsonify({'error': 'Invalid thumbnail key'}), 400
+    path = downloader.thumbnails.get(thumb_key)
+    if not path:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    response = send_file(str(path), mimetype=ThumbnailCache.content_type(path), max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def _admit_download(download_id: str, url: str, quality: str, audio_only: bool) -> bool:
+    """Reserve the job's estimated peak disk usage, queueing while space is short."""
+    state = active_downloads.get(download_id, {})
+    info = downloader.get_video_info(url)
+    required = downloader.estimate_required_bytes(info, quality, audio_only) if info else None
+    state['reserved_bytes'] = required
+
+    def mark_queued():
+        state['status'] = 'queued'
+        logger.info("Download queued: waiting for %s bytes of storage", required)
+
+    try:
+        if not storage.reserve(download_id, required, on_wait=mark_queued):
+            state.update({'status': 'error', 'error': 'Not enough storage space (timed out waiting for space)'})
+            return False
+    except OSError as e:
+        state.update({'status': 'error', 'error': str(e)})
+        return False
+    state['status'] = 'starting'
+    return True
+
+
 @app.route('/api/download', methods=['POST'])
 def start_download():
     """Start video download with optimized error handling."""
@@ -376,20 +498,38 @@ def start_download():
         quality = data.get('quality', 'best')
         audio_only = data.get('audio_only', False)
         audio_language = data.get('audio_language')
+        audio_format = data.get('audio_format') or None
         output_name = (data.get('output_name') or '').strip() or None
         insecure_ssl = bool(data.get('insecure_ssl'))
 
-        print(f"[DEBUG] Received output_name for download: {output_name}")
-        print(f"[DEBUG] Received audio_language for download: {audio_language}")
+        logger.debug("Received output_name=%r audio_language=%r", output_name, audio_language)
 
         download_id = str(uuid.uuid4())
 
+        # Reject early when the job can never fit; only uses info already extracted for the preview
+        cached_info = downloader._cached_info(url)
+        if cached_info:
+            required = downloader.estimate_required_bytes(cached_info, quality, audio_only)
+            if required and required > storage.capacity():
+                resp = make_response(json.dumps({
+                    'error': 'Not enough storage space for this download',
+                    'required_bytes': required,
+                    'capacity_bytes': storage.capacity(),
+                }), 507)
+                resp.headers['Content-Type'] = 'application/json; charset=utf-8'
+                return resp
+
         def download_task():
+            with job_context(download_id):
+                run_download()
+
+        def run_download():
             prev_insecure = getattr(downloader, 'insecure_ssl', False)
             try:
                 downloader.insecure_ssl = insecure_ssl
                 downloader.audio_only = audio_only
                 downloader.audio_language = audio_language
+                downloader.audio_format = audio_format
                 downloader.set_download_id(download_id)
 
                 if download_id in active_downloads:
@@ -412,6 +552,9 @@ def start_download():
                     if notices:
                         state['download_notice'] = notices
 
+                if not _admit_download(download_id, url, quality, audio_only):
+                    return
+
                 success = downloader.download_video(url, quality, audio_only, output_name)
                 if not success and download_id in active_downloads:
                     active_downloads[download_id]['status'] = 'error'
@@ -422,6 +565,7 @@ def start_download():
                     active_downloads[download_id]['error'] = str(e)
             finally:
                 downloader.insecure_ssl = prev_insecure
+                storage.release_reservation(download_id)
 
         thread = threading.Thread(target=download_task, daemon=True)
         thread.start()
@@ -452,152 +596,238 @@ def get_progress(download_id: str):
         return jsonify({'error': f'Progress error: {str(e)}'}), 500
 
 
+def _apply_cors_headers(response):
+    """Add CORS headers only when a cross-origin consumer is configured (YTDL_CORS_ORIGIN)."""
+    origin = app.config.get('CORS_ALLOW_ORIGIN')
+    if origin:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Range, If-None-Match, If-Range'
+        response.headers['Access-Control-Expose-Headers'] = 'Content-Length, Content-Range, ETag, Accept-Ranges'
+    return response
+
+
+def file_etag(path: Path) -> str:
+    """Strong ETag derived from size and mtime; changes whenever the file is replaced."""
+    st = path.stat()
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def send_download(path: Path, file_info: Optional[Dict[str, Any]] = None, download_name: Optional[str] = None):
+    """Deliver a downloaded file with strong ETag, conditional GET and Range support.
+
+    The body is handed to the server's wsgi.file_wrapper; with YTDL_ACCEL_REDIRECT_PREFIX
+    (nginx) or YTDL_X_SENDFILE=1 (Apache/lighttpd) the reverse proxy sends the bytes instead.
+    """
+    etag = file_etag(path)
+    if file_info is not None:
+        file_info['etag'] = etag
+    download_name = download_name or path.name
+    accel_prefix = app.config.get('ACCEL_REDIRECT_PREFIX')
+    use_proxy = bool(accel_prefix) or app.config.get('USE_X_SENDFILE')
+
+    # The proxy handles Range/conditional requests itself when it serves the file
+    response = werkzeug_send_file(
+        str(path), request.environ, as_attachment=True, download_name=download_name,
+        conditional=not use_proxy, etag=etag, use_x_sendfile=use_proxy,
+        response_class=app.response_class,
+    )
+    if accel_prefix:
+        relative = path.resolve().relative_to(Path('./downloads').resolve()).as_posix()
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative)}"
+    metrics.inc('ytdl_files_served_total', help='Download responses', proxied='yes' if use_proxy else 'no')
+    # Record the access for LRU eviction and keep the file from being evicted while it is sent
+    storage.acquire(path)
+    response.call_on_close(lambda: storage.release(path))
+    return _apply_cors_headers(response)
+
+
+def _locate_download_file(download_id: str, file_info: Optional[Dict[str, Any]]) -> Optional[Path]:
+    """Resolve a job's output: the recorded path first, a downloads directory scan only as fallback."""
+    downloads_dir = Path('./downloads').resolve()
+    file_path = file_info.get('file_path') if file_info else None
+    if file_path:
+        try:
+            p = Path(file_path).resolve()
+            # Ensure it's inside our downloads dir
+            p.relative_to(downloads_dir)
+            if p.is_file():
+                return p
+        except (ValueError, OSError):
+            # Not inside downloads dir - treat as missing for safety
+            pass
+
+    if not downloads_dir.exists():
+        return None
+    expected_names = set()
+    if file_info:
+        name = file_info.get('filename')
+        if name:
+            expected_names.add(name)
+            expected_names.add(name.lower())
+
+    # Walk the downloads directory for a best match
+    for candidate in downloads_dir.glob('*'):
+        if not candidate.is_file():
+            continue
+        candidate_name = candidate.name
+        if expected_names:
+            match = candidate_name in expected_names or candidate_name.lower() in expected_names
+            # Also accept case-insensitive or partial matches if nothing exact found
+            if not match:
+                match = any(en and (en in candidate_name or candidate_name in en) for en in expected_names)
+        else:
+            match = download_id in candidate_name
+        if match:
+            found = candidate.resolve()
+            # Persist for future requests
+            if file_info is not None:
+                file_info['file_path'] = str(found)
+            return found
+    return None
+
+
 @app.route('/api/download/<download_id>/file', methods=['GET', 'HEAD', 'OPTIONS'])
 def download_file(download_id: str):
     """Download completed file by ID."""
     try:
         if request.method == 'OPTIONS':
-            response = make_response('', 204)
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            return response
+            return _apply_cors_headers(make_response('', 204))
 
         file_info = completed_downloads.get(download_id) or active_downloads.get(download_id)
-        file_path = file_info.get('file_path') if file_info else None
-
-        # If file_path is present but missing on disk, or not provided at all,
-        # try to map the download id / filename to an actual file in the downloads directory.
-        downloads_dir = Path('./downloads').resolve()
-        def persist_found_path(found_path: Path):
-            nonlocal file_path, file_info
-            file_path = str(found_path)
-            # Persist for future requests
-            try:
-                if download_id in completed_downloads:
-                    completed_downloads[download_id]['file_path'] = file_path
-                elif download_id in active_downloads:
-                    active_downloads[download_id]['file_path'] = file_path
-            except Exception:
-                pass
+        file_path = _locate_download_file(download_id, file_info)
+        if not file_path:
+            return jsonify({'error': 'File not found or no longer available'}), 404
 
-        if file_path:
-            try:
-                p = Path(file_path).resolve()
-                # Ensure it's inside our downloads dir
-                try:
-                    p.relative_to(downloads_dir)
-                except ValueError:
-                    # Not inside downloads dir - treat as missing for safety
-                    p = None
-                if not p or not p.exists():
-                    file_path = None
-                else:
-                    file_path = str(p)
-            except Exception:
-                file_path = None
-
-        # Try to locate by filename or download id if we don't have a valid file_path yet
-        if (not file_path) and downloads_dir.exists():
-            expected_names = set()
-            if file_info:
-                name = file_info.get('filename')
-                if name:
-                    expected_names.add(name)
-                    expected_names.add(name.lower())
-
-            # Walk the downloads directory for a best match
-            for candidate in downloads_dir.glob('*'):
-                if not candidate.is_file():
-                    continue
+        response = send_download(file_path, file_info)
+        notice = file_info.get('download_notice') if file_info else None
+        if notice:
+            response.headers['X-Download-Notice'] = notice
+        return response
+    except Exception as e:
+        logger.error("Download error for %s: %s", download_id, e)
+        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
-                candidate_name = candidate.name
-                match = False
-                if expected_names:
-                    if candidate_name in expected_names or candidate_name.lower() in expected_names:
-                        match = True
-                else:
-                    if download_id in candidate_name:
-                        match = True
-
-                # Also accept case-insensitive or partial matches if nothing exact found
-                if not match and expected_names:
-                    for en in expected_names:
-                        if en and (en in candidate_name or candidate_name in en or candidate_name.lower() == en.lower()):
-                            match = True
-                            break
 
-                if match:
-                    persist_found_path(candidate.resolve())
-                    break
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_POLL_INTERVAL = 0.25
+STREAM_START_TIMEOUT = 60
 
-        if file_path and os.path.exists(file_path):
-            if request.method == 'HEAD':
-                response = make_response('', 200)
-            else:
-                filename = os.path.basename(file_path)
-                if isinstance(filename, bytes):
-                    filename = filename.decode('utf-8', errors='ignore')
-                try:
-                    response = send_file(file_path, as_attachment=True, download_name=filename)
-                except TypeError:
-                    response = send_file(file_path, as_attachment=True, attachment_filename=filename)
-
-            notice = file_info.get('download_notice') if file_info else None
-            if notice:
-                response.headers['X-Download-Notice'] = notice
-
-            response.headers['X-Content-Type-Options'] = 'nosniff'
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['Referrer-Policy'] = 'no-referrer'
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            return response
-
-        downloads_dir = Path('./downloads')
-        if downloads_dir.exists():
-            expected_names = set()
-            if file_info:
-                name = file_info.get('filename')
-                if name:
-                    expected_names.add(name)
-                    expected_names.add(name.lower())
-            for candidate in downloads_dir.glob('*'):
-                if not candidate.is_file():
-                    continue
 
-                candidate_name = candidate.name
-                if expected_names and candidate_name not in expected_names and candidate_name.lower() not in expected_names:
-                    continue
+def _follow_stream_part(download_id: str, stream: str, stop: threading.Event):
+    """Yield bytes of a stream's file as yt-dlp writes it, following the write offset.
 
-                if not expected_names and download_id not in candidate_name:
+    The descriptor stays valid when yt-dlp renames `.part` to its final name,
+    so the reader simply keeps going until the stream is marked done.
+    """
+    deadline = time.time() + STREAM_START_TIMEOUT
+    fh = None
+    try:
+        while not stop.is_set():
+            job = active_downloads.get(download_id) or completed_downloads.get(download_id) or {}
+            part = job.get('stream_parts', {}).get(stream, {})
+            if fh is None:
+                for candidate in (part.get('tmpfilename'), part.get('filename')):
+                    if candidate and os.path.exists(candidate):
+                        fh = open(candidate, 'rb')
+                        break
+                if fh is None:
+                    if job.get('status') in ('error', None) or time.time() > deadline:
+                        return
+                    time.sleep(STREAM_POLL_INTERVAL)
                     continue
+            chunk = fh.read(STREAM_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if part.get('done') or job.get('status') in ('completed', 'error'):
+                # Drain anything written between the last read and the done flag
+                rest = fh.read()
+                if rest:
+                    yield rest
+                return
+            time.sleep(STREAM_POLL_INTERVAL)
+    finally:
+        if fh is not None:
+            fh.close()
+
+
+def _stream_merged_fmp4(download_id: str):
+    """Mux the growing video and audio parts into fragmented MP4 on the fly."""
+    stop = threading.Event()
+    fds = {'video': os.pipe(), 'audio': os.pipe()}
+    ffmpeg_cmd = getattr(downloader.merger, 'ffmpeg_path', 'ffmpeg')
+    cmd = [ffmpeg_cmd, '-hide_banner', '-loglevel', 'error',
+           '-i', f"pipe:{fds['video'][0]}", '-i', f"pipe:{fds['audio'][0]}",
+           '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy',
+           '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4', 'pipe:1']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            pass_fds=(fds['video'][0], fds['audio'][0]))
+    for read_fd, _ in fds.values():
+        os.close(read_fd)
+
+    def feed(stream: str, write_fd: int) -> None:
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe:
+                for chunk in _follow_stream_part(download_id, stream, stop):
+                    pipe.write(chunk)
+        except (BrokenPipeError, OSError):
+            pass
 
-                if request.method == 'HEAD':
-                    response = make_response('', 200)
-                else:
-                    filename = candidate_name
-                    if isinstance(filename, bytes):
-                        filename = filename.decode('utf-8', errors='ignore')
-                    try:
-                        response = send_file(str(candidate), as_attachment=True, download_name=filename)
-                    except TypeError:
-                        response = send_file(str(candidate), as_attachment=True, attachment_filename=filename)
-
-                response.headers['X-Content-Type-Options'] = 'nosniff'
-                response.headers['X-Frame-Options'] = 'DENY'
-                response.headers['Referrer-Policy'] = 'no-referrer'
-                response.headers['Access-Control-Allow-Origin'] = '*'
-                response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-                response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-                response.headers['X-Fallback-Download'] = 'true'
-                return response
-
+    feeders = [threading.Thread(target=feed, args=(stream, w_fd), daemon=True) for stream, (_, w_fd) in fds.items()]
+    for feeder in feeders:
+        feeder.start()
+    try:
+        while True:
+            chunk = proc.stdout.read1(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stop.set()
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+
+@app.route('/api/download/<download_id>/stream', methods=['GET'])
+def stream_download(download_id: str):
+    """Progressive delivery: serve the output while it is still being downloaded."""
+    job = completed_downloads.get(download_id) or active_downloads.get(download_id)
+    if not job:
+        return jsonify({'error': 'Download not found'}), 404
+    if job.get('status') == 'completed':
+        file_path = _locate_download_file(download_id, job)
+        if file_path:
+            return send_download(file_path, job)
         return jsonify({'error': 'File not found or no longer available'}), 404
-    except Exception as e:
-        print(f"Download error for {download_id}: {str(e)}")
-        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
+
+    # Wait briefly for the first bytes so we know how the job is delivered
+    deadline = time.time() + STREAM_START_TIMEOUT
+    while not job.get('delivery') and job.get('status') not in ('error', 'completed') and time.time() < deadline:
+        time.sleep(STREAM_POLL_INTERVAL)
+    delivery = job.get('delivery')
+
+    if delivery == 'single':
+        part = job.get('stream_parts', {}).get('main', {})
+        response = Response(_follow_stream_part(download_id, 'main', threading.Event()),
+                            mimetype=mimetypes.guess_type(part.get('filename') or '')[0] or 'application/octet-stream')
+        if part.get('total_bytes'):
+            response.headers['Content-Length'] = str(part['total_bytes'])
+    elif delivery == 'merged' and downloader.merger.ffmpeg_available and os.name != 'nt':
+        response = Response(_stream_merged_fmp4(download_id), mimetype='video/mp4')
+    else:
+        response = jsonify({'error': 'Progressive delivery is not available for this download; '
+                                     'use /api/download/<id>/file once it completes'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '5'
+        return response
+
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Progressive-Download'] = delivery
+    return _apply_cors_headers(response)
 
 
 @app.route('/download_by_filename/<path:filename>', methods=['GET', 'HEAD'])
@@ -608,11 +838,7 @@ def download_by_filename(filename: str):
         safe_filename = os.path.basename(filename)
         
         # Handle URL encoding/decoding
-        try:
-            from urllib.parse import unquote
-            safe_filename = unquote(safe_filename)
-        except Exception:
-            pass
+        safe_filename = unquote(safe_filename)
         
         # Validate filename doesn't contain path separators
         if os.path.sep in safe_filename or (os.path.altsep and os.path.altsep in safe_filename):
@@ -627,66 +853,30 @@ def download_by_filename(filename: str):
         
         if not file_path or not file_path.exists() or not file_path.is_file():
             # Try to find files that might match closely
+            file_path = None
             if downloads_dir.exists():
                 for existing_file in downloads_dir.glob('*'):
                     if existing_file.is_file():
                         existing_name = existing_file.name
-                        # Try exact match first
-                        if existing_name == safe_filename:
-                            file_path = existing_file
-                            break
-                        # Try case-insensitive match
-                        elif existing_name.lower() == safe_filename.lower():
-                            file_path = existing_file
-                            break
-                        # Try partial match (useful for files with special characters)
-                        elif safe_filename in existing_name or existing_name in safe_filename:
+                        # Exact, case-insensitive or partial match (useful for files with special characters)
+                        if (existing_name.lower() == safe_filename.lower()
+                                or safe_filename in existing_name or existing_name in safe_filename):
                             file_path = existing_file
                             break
         
-        if not file_path or not file_path.exists() or not file_path.is_file():
-            return jsonify({'error': 'File not found'}), 404 if request.method == 'GET' else ('', 404)
+        if not file_path:
+            return jsonify({'error': 'File not found'}), 404
         
         # Double-check the file is still within downloads directory
         try:
-            file_path.relative_to(downloads_dir)
+            file_path.resolve().relative_to(downloads_dir)
         except ValueError:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Handle HEAD request - just check if file exists
-        if request.method == 'HEAD':
-            return '', 200
-        
-        # Handle GET request - actual file download
-        try:
-            filename_to_send = file_path.name
-            # Ensure filename is properly encoded
-            if isinstance(filename_to_send, bytes):
-                filename_to_send = filename_to_send.decode('utf-8', errors='ignore')
-            
-            try:
-                # Try newer Flask version parameter first
-                response = send_file(str(file_path), as_attachment=True, download_name=filename_to_send)
-            except TypeError:
-                # Fallback to older Flask version parameter
-                response = send_file(str(file_path), as_attachment=True, attachment_filename=filename_to_send)
-            
-            # Add security headers
-            response.headers['X-Content-Type-Options'] = 'nosniff'
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['Referrer-Policy'] = 'no-referrer'
-            # Add CORS headers for better compatibility
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            
-            return response
-        except Exception as e:
-            print(f"Error sending file {file_path}: {str(e)}")
-            return jsonify({'error': f'Download error: {str(e)}'}), 500
+        return send_download(file_path)
     
     except Exception as e:
-        print(f"General error in download_by_filename for {filename}: {str(e)}")
+        logger.error("General error in download_by_filename for %s: %s", filename, e)
         return jsonify({'error': f'Download error: {str(e)}'}), 500
 
 @app.route('/api/open_file', methods=['POST'])
@@ -714,7 +904,7 @@ def open_file():
         try:
             target_path.relative_to(downloads_dir)
         except ValueError:
-            print(f"Security: Attempted access outside downloads directory: {file_path}")
+            logger.warning("Security: Attempted access outside downloads directory: %s", file_path)
             return jsonify({'error': 'File outside downloads directory is not allowed'}), 403
 
         if not target_path.exists() or not target_path.is_file():
@@ -729,13 +919,13 @@ def open_file():
             else:  # Linux and other Unix-like systems
                 subprocess.Popen(['xdg-open', str(target_path)])
         except Exception as open_err:
-            print(f"Error opening file: {open_err}")
+            logger.error("Error opening file: %s", open_err)
             return jsonify({'error': f'Unable to open file: {open_err}'}), 500
 
         return jsonify({'status': 'opened', 'file': target_path.name})
 
     except Exception as e:
-        print(f"Unexpected error in open_file: {str(e)}")
+        logger.error("Unexpected error in open_file: %s", e)
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 @app.route('/api/debug_formats', methods=['POST'])
@@ -775,6 +965,46 @@ def internal_error(error):
     return resp
 
 
+def _api_token_ok() -> bool:
+    """Check X-API-Token / ?token= against DOWNLOADS_API_TOKEN (open when no token is configured)."""
+    token = os.environ.get('DOWNLOADS_API_TOKEN') or app.config.get('DOWNLOADS_API_TOKEN')
+    if not token:
+        return True
+    req_token = request.headers.get('X-API-Token') or request.args.get('token')
+    return bool(req_token) and req_token == token
+
+
+@app.route('/api/storage', methods=['GET', 'POST'])
+def storage_status():
+    """Storage quota state; POST {action: pin|unpin|sweep, filename} to manage it. Secured with a token."""
+    try:
+        if not _api_token_ok():
+            return jsonify({'error': 'Unauthorized'}), 401
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            action = data.get('action')
+            if action == 'sweep':
+                return jsonify({'status': 'ok', 'result': storage.run_once()})
+            if action not in ('pin', 'unpin'):
+                return jsonify({'error': 'action must be pin, unpin or sweep'}), 400
+            file_path = validate_safe_path(os.path.basename(data.get('filename') or ''), Path('./downloads').resolve())
+            if not file_path or not file_path.is_file():
+                return jsonify({'error': 'File not found'}), 404
+            storage.pin(file_path) if action == 'pin' else storage.unpin(file_path)
+        return jsonify(storage.status())
+    except Exception as e:
+        logger.error('Error reading storage status: %s', e)
+        return jsonify({'error': f'Internal error: {e}'}), 500
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of pipeline spans, counters and live gauges."""
+    if not _api_token_ok():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/completed_downloads', methods=['GET'])
 def list_completed_downloads():
     """Return a JSON list of completed downloads. Secured with a token.
@@ -783,11 +1013,8 @@ def list_completed_downloads():
     to protect this endpoint.
     """
     try:
-        token = os.environ.get('DOWNLOADS_API_TOKEN') or app.config.get('DOWNLOADS_API_TOKEN')
-        if token:
-            req_token = request.headers.get('X-API-Token') or request.args.get('token')
-            if not req_token or req_token != token:
-                return jsonify({'error': 'Unauthorized'}), 401
+        if not _api_token_ok():
+            return jsonify({'error': 'Unauthorized'}), 401
 
         # Build a minimal safe listing
         results = []
@@ -804,7 +1031,7 @@ def list_completed_downloads():
 
         return jsonify({'completed': results}), 200
     except Exception as e:
-        print(f'Error listing completed downloads: {e}')
+        logger.error('Error listing completed downloads: %s', e)
         return jsonify({'error': f'Internal error: {e}'}), 500
 
 @app.after_request
@@ -824,6 +1051,8 @@ def add_security_headers(response):
 if __name__ == '__main__':
     import platform
     
+    configure_logging()
+
     # Ensure templates directory exists
     templates_dir = Path('templates')
     templates_dir.mkdir(exist_ok=True)
@@ -831,6 +1060,9 @@ if __name__ == '__main__':
     # Ensure downloads directory exists
     downloads_dir = Path('downloads')
     downloads_dir.mkdir(exist_ok=True)
+
+    # Periodic orphan sweep and quota enforcement
+    storage.start()
     
     # Platform information
     system_info = f"{platform.system()} {platform.release()}"
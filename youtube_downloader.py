@@ -13,25 +13,264 @@ A robust YouTube downloader with advanced features:
 
 import os
 import sys
+import errno
 import argparse
 import tempfile
 import threading
 import time
 import concurrent.futures
+import contextvars
+import functools
+import logging
+import logging.handlers
+import queue
+import atexit
 import random
 import json
 import platform
 import re
 import subprocess
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple, List
 
 import yt_dlp
+from yt_dlp.postprocessor.common import PostProcessor
 from colorama import init, Fore, Style
 
 # Initialize colorama for cross-platform colored output
 init(autoreset=True)
 
+# Structured logging: loggers live under 'ytdl' ('ytdl.core', 'ytdl.web', ...)
+logger = logging.getLogger('ytdl.core')
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar('ytdl_job_id', default=None)
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+@contextmanager
+def job_context(job_id: Optional[str]):
+    """Attach job_id to every log record emitted in this context (and tasks copied from it)."""
+    token = _current_job.set(job_id)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+class JobContextFilter(logging.Filter):
+    """Stamp records with the current job ID; runs in the emitting thread, before queueing."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'job_id'):
+            record.job_id = _current_job.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'job_id': getattr(record, 'job_id', '-'),
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Colored console output matching the CLI's look; the job ID is shown when set."""
+
+    COLORS = {logging.DEBUG: Style.DIM, logging.INFO: Fore.CYAN, logging.WARNING: Fore.YELLOW,
+              logging.ERROR: Fore.RED, logging.CRITICAL: Fore.RED}
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        job_id = getattr(record, 'job_id', '-')
+        if job_id != '-':
+            message = f"[{job_id[:8]}] {message}"
+        return f"{self.COLORS.get(record.levelno, '')}{message}{Style.RESET_ALL}"
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, quiet: bool = False,
+                      stream=None) -> None:
+    """Route 'ytdl' loggers through a non-blocking queue to a single writer thread.
+
+    level/fmt default to YTDL_LOG_LEVEL (INFO) and YTDL_LOG_FORMAT (text|json);
+    YTDL_LOG_LEVELS sets per-module levels, e.g. "ytdl.web=WARNING,ytdl.core=DEBUG".
+    Quiet mode (or YTDL_QUIET=1) raises the level to WARNING so suppressed calls
+    return after a cached level check.
+    """
+    global _log_listener
+    quiet = quiet or os.environ.get('YTDL_QUIET') == '1'
+    level = 'WARNING' if quiet else (level or os.environ.get('YTDL_LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.environ.get('YTDL_LOG_FORMAT', 'text')).lower()
+
+    root = logging.getLogger('ytdl')
+    root.setLevel(level)
+    root.propagate = False
+    for name_level in filter(None, os.environ.get('YTDL_LOG_LEVELS', '').split(',')):
+        name, _, module_level = name_level.partition('=')
+        if module_level and not quiet:
+            logging.getLogger(name.strip()).setLevel(module_level.strip().upper())
+
+    _stop_log_listener()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else ConsoleFormatter('%(message)s'))
+    log_queue: 'queue.SimpleQueue' = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(JobContextFilter())
+    root.addHandler(queue_handler)
+    _log_listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _log_listener.start()
+
+
+@atexit.register
+def _stop_log_listener() -> None:
+    """Flush queued records; also used when logging is reconfigured."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+class MetricsRegistry:
+    """Process-wide counters and latency histograms, exported in Prometheus text format.
+
+    Updates are a dict lookup and an addition under a lock, cheap enough to
+    leave on in production. Gauges are callables evaluated only at scrape time.
+    """
+
+    DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    _shared: Optional['MetricsRegistry'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List[Any]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: Dict[str, Any] = {}
+
+    @classmethod
+    def shared(cls) -> 'MetricsRegistry':
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def inc(self, name: str, value: float = 1, help: str = '', **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ('counter', help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, help: str = '',
+                buckets: Optional[Tuple[float, ...]] = None, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ('histogram', help))
+            bounds = self._buckets.setdefault(name, buckets or self.DEFAULT_BUCKETS)
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(bounds), 0.0, 0]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time a pipeline stage into ytdl_stage_duration_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('ytdl_stage_duration_seconds', time.perf_counter() - start,
+                         'Wall time per pipeline stage', stage=stage, **labels)
+
+    def register_gauge(self, name: str, help: str, func) -> None:
+        """func() returns a number, or a dict mapping label tuples to numbers."""
+        with self._lock:
+            self._meta[name] = ('gauge', help)
+            self._gauges[name] = func
+
+    def value(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = '') -> str:
+        parts = [f'{k}="{str(v)}"'.replace('\n', ' ') for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+    def render(self) -> str:
+        with self._lock:
+            meta = dict(self._meta)
+            counters = dict(self._counters)
+            histograms = {k: [list(v[0]), v[1], v[2]] for k, v in self._histograms.items()}
+            buckets = dict(self._buckets)
+            gauges = dict(self._gauges)
+        lines = []
+        for name in sorted(meta):
+            kind, help_text = meta[name]
+            lines.append(f'# HELP {name} {help_text or name}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f'{name}{self._labels(labels)} {value:g}')
+            elif kind == 'histogram':
+                for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, c in zip(buckets[name], counts):
+                        cumulative += c
+                        le = 'le="%g"' % bound
+                        lines.append(f'{name}_bucket{self._labels(labels, le)} {cumulative}')
+                    le = 'le="+Inf"'
+                    lines.append(f'{name}_bucket{self._labels(labels, le)} {count}')
+                    lines.append(f'{name}_sum{self._labels(labels)} {total:.6f}')
+                    lines.append(f'{name}_count{self._labels(labels)} {count}')
+            else:
+                try:
+                    result = gauges[name]()
+                except Exception:
+                    continue
+                if isinstance(result, dict):
+                    for labels, value in sorted(result.items()):
+                        lines.append(f'{name}{self._labels(labels)} {value:g}')
+                else:
+                    lines.append(f'{name} {result:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def timed_stage(stage: str):
+    """Decorator recording a method's wall time as a pipeline stage span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with MetricsRegistry.shared().span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 class ErrorHandler:
     """Error recovery system for streaming downloads."""
     
@@ -105,12 +344,194 @@ class ErrorHandler:
         
         return opts
 
+class ToolchainRegistry:
+    """Process-wide ffmpeg/ffprobe discovery with a persistent capability cache.
+
+    Probing runs once per binary; results are stored in a JSON file keyed by the
+    binary path and invalidated when its size or mtime changes, so every
+    downloader instance and worker process reuses the same answer.
+    """
+
+    CACHE_VERSION = 1
+    HW_ENCODER_SUFFIXES = ('_nvenc', '_qsv', '_vaapi', '_videotoolbox', '_amf', '_v4l2m2m', '_mf')
+
+    _shared: Optional['ToolchainRegistry'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_path: Optional[str] = None):
+        default_cache = Path(tempfile.gettempdir()) / 'ytdl_toolchain.json'
+        self.cache_path = Path(cache_path or os.environ.get('YTDL_TOOLCHAIN_CACHE') or default_cache)
+        self._lock = threading.Lock()
+        self._toolchain: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def shared(cls) -> 'ToolchainRegistry':
+        """Return the registry shared by all instances in this process."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def get(self) -> Dict[str, Any]:
+        """Return the discovered toolchain, probing only on first use or binary change."""
+        with self._lock:
+            if self._toolchain is None:
+                self._toolchain = self._discover()
+            return self._toolchain
+
+    def refresh(self) -> Dict[str, Any]:
+        """Drop the in-memory result and re-validate against the binaries on disk."""
+        with self._lock:
+            self._toolchain = self._discover()
+            return self._toolchain
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.get().get('encoders', [])
+
+    def has_muxer(self, name: str) -> bool:
+        return name in self.get().get('muxers', [])
+
+    def hardware_encoders(self) -> List[str]:
+        return [e for e in self.get().get('encoders', []) if e.endswith(self.HW_ENCODER_SUFFIXES)]
+
+    @staticmethod
+    def _ffmpeg_candidates() -> List[str]:
+        """Existing ffmpeg binaries in search order (PATH, embedded, common install paths)."""
+        candidates = []
+        found = shutil.which('ffmpeg')
+        if found:
+            candidates.append(found)
+        candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_embedded', 'bin', 'ffmpeg.exe'))
+        system = platform.system()
+        if system == 'Linux':
+            candidates += ['/usr/bin/ffmpeg', '/usr/local/bin/ffmpeg', '/snap/bin/ffmpeg',
+                           '/opt/homebrew/bin/ffmpeg']  # If using Homebrew on Linux
+        elif system == 'Darwin':  # macOS
+            candidates += ['/usr/local/bin/ffmpeg', '/opt/homebrew/bin/ffmpeg',  # Apple Silicon Homebrew
+                           '/usr/bin/ffmpeg', '/Applications/ffmpeg']
+        seen = set()
+        existing = []
+        for path in candidates:
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                existing.append(path)
+        return existing
+
+    @staticmethod
+    def _signature(path: Optional[str]) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+            return [st.st_size, st.st_mtime_ns]
+        except (OSError, TypeError):
+            return None
+
+    @staticmethod
+    def _find_ffprobe(ffmpeg_path: str) -> Optional[str]:
+        """Locate ffprobe next to ffmpeg (also through symlinks), then on PATH."""
+        name = 'ffprobe.exe' if ffmpeg_path.lower().endswith('.exe') else 'ffprobe'
+        for directory in (os.path.dirname(ffmpeg_path), os.path.dirname(os.path.realpath(ffmpeg_path))):
+            sibling = os.path.join(directory, name)
+            if os.path.isfile(sibling):
+                return sibling
+        return shutil.which('ffprobe')
+
+    @staticmethod
+    def _run(cmd: List[str], timeout: int = 10) -> Optional[str]:
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                                    errors='replace', timeout=timeout)
+            return result.stdout if result.returncode == 0 else None
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            return None
+
+    @staticmethod
+    def _parse_table(output: Optional[str], separator: str) -> List[str]:
+        """Parse `ffmpeg -encoders`/`-muxers` listings into a list of names."""
+        names: List[str] = []
+        if not output:
+            return names
+        in_table = False
+        for line in output.splitlines():
+            if not in_table:
+                in_table = line.strip().startswith(separator)
+                continue
+            parts = line.split()
+            if len(parts) >= 2:
+                names.extend(n for n in parts[1].split(',') if n)
+        return names
+
+    def _probe(self, ffmpeg_path: str) -> Optional[Dict[str, Any]]:
+        """Run ffmpeg once for version, encoders, muxers and hwaccels."""
+        version_out = self._run([ffmpeg_path, '-version'], timeout=5)
+        if version_out is None:
+            return None
+        first_line = version_out.splitlines()[0] if version_out else ''
+        tokens = first_line.split()
+        ffprobe = self._find_ffprobe(ffmpeg_path)
+        hwaccels = self._run([ffmpeg_path, '-hide_banner', '-hwaccels']) or ''
+        return {
+            'ffmpeg': ffmpeg_path,
+            'ffprobe': ffprobe,
+            'ffprobe_signature': self._signature(ffprobe),
+            'version': tokens[2] if len(tokens) > 2 else 'unknown',
+            'encoders': self._parse_table(self._run([ffmpeg_path, '-hide_banner', '-encoders']), '------'),
+            'muxers': self._parse_table(self._run([ffmpeg_path, '-hide_banner', '-muxers']), '--'),
+            'hwaccels': [l.strip() for l in hwaccels.splitlines()[1:] if l.strip()],
+        }
+
+    def _load_cache(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if data.get('version') == self.CACHE_VERSION and isinstance(data.get('entries'), dict):
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'version': self.CACHE_VERSION, 'entries': {}}
+
+    def _save_cache(self, data: Dict[str, Any]) -> None:
+        """Write the cache atomically so concurrent processes never read a torn file."""
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=str(self.cache_path.parent), prefix='.ytdl_toolchain.')
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def _discover(self) -> Dict[str, Any]:
+        cache = self._load_cache()
+        entries = cache['entries']
+        dirty = False
+        result: Optional[Dict[str, Any]] = None
+        for path in self._ffmpeg_candidates():
+            signature = self._signature(path)
+            entry = entries.get(path)
+            if (entry and entry.get('signature') == signature
+                    and (not entry.get('ok') or entry['toolchain'].get('ffprobe_signature')
+                         == self._signature(entry['toolchain'].get('ffprobe')))):
+                toolchain = entry['toolchain'] if entry.get('ok') else None
+            else:
+                toolchain = self._probe(path)
+                entries[path] = {'signature': signature, 'ok': toolchain is not None, 'toolchain': toolchain or {}}
+                dirty = True
+            if toolchain:
+                result = toolchain
+                break
+        if dirty:
+            self._save_cache(cache)
+        return result or {'ffmpeg': None, 'ffprobe': None, 'version': None,
+                          'encoders': [], 'muxers': [], 'hwaccels': []}
+
 class VideoMerger:
     """Pure Python video/audio merger using MoviePy."""
     
     def __init__(self):
         self.available = self._check_moviepy()
+        self.registry = ToolchainRegistry.shared()
         self.ffmpeg_path = 'ffmpeg'  # Default to system PATH
+        self.ffprobe_path: Optional[str] = None
         self.ffmpeg_available = self._check_ffmpeg()
         
     def _check_moviepy(self) -> bool:
@@ -123,69 +544,12 @@ class VideoMerger:
             return False
     
     def _check_ffmpeg(self) -> bool:
-        """Check FFmpeg availability in PATH and embedded Python directory."""
-        
-        # First try system PATH
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, encoding='utf-8', timeout=5)
-            if result.returncode == 0:
-                return True
-        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-            pass
-        
-        # Check embedded Python directory (Windows)
-        try:
-            embedded_ffmpeg = os.path.join(os.path.dirname(__file__), 'python_embedded', 'bin', 'ffmpeg.exe')
-            if os.path.exists(embedded_ffmpeg):
-                result = subprocess.run([embedded_ffmpeg, '-version'], 
-                                      capture_output=True, text=True, encoding='utf-8', timeout=5)
-                if result.returncode == 0:
-                    # Store the path for later use
-                    self.ffmpeg_path = embedded_ffmpeg
-                    return True
-        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-            pass
-        
-        # Check common installation paths for Linux/macOS
-        system = platform.system()
-        
-        if system == 'Linux':
-            linux_paths = [
-                '/usr/bin/ffmpeg',
-                '/usr/local/bin/ffmpeg',
-                '/snap/bin/ffmpeg',
-                '/opt/homebrew/bin/ffmpeg'  # If using Homebrew on Linux
-            ]
-            for path in linux_paths:
-                if os.path.exists(path):
-                    try:
-                        result = subprocess.run([path, '-version'], 
-                                              capture_output=True, text=True, encoding='utf-8', timeout=5)
-                        if result.returncode == 0:
-                            self.ffmpeg_path = path
-                            return True
-                    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                        continue
-        
-        elif system == 'Darwin':  # macOS
-            macos_paths = [
-                '/usr/local/bin/ffmpeg',
-                '/opt/homebrew/bin/ffmpeg',  # Apple Silicon Homebrew
-                '/usr/bin/ffmpeg',
-                '/Applications/ffmpeg'
-            ]
-            for path in macos_paths:
-                if os.path.exists(path):
-                    try:
-                        result = subprocess.run([path, '-version'], 
-                                              capture_output=True, text=True, encoding='utf-8', timeout=5)
-                        if result.returncode == 0:
-                            self.ffmpeg_path = path
-                            return True
-                    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                        continue
-            
+        """Check FFmpeg availability via the shared toolchain registry."""
+        toolchain = self.registry.get()
+        if toolchain.get('ffmpeg'):
+            self.ffmpeg_path = toolchain['ffmpeg']
+            self.ffprobe_path = toolchain.get('ffprobe')
+            return True
         return False
     
     def merge_streams(self, video_path: str, audio_path: str, output_path: str) -> bool:
@@ -226,19 +590,750 @@ class VideoMerger:
             print(f"{Fore.RED}❌ Merge failed: {e}")
             return False
 
+class OutputFinalizer:
+    """Atomic output finalization: write to a temp file in the target directory, fsync, rename.
+
+    The backup policy controls what happens to a file that is being superseded
+    (e.g. by a remux): 'none' removes it, 'keep' retains it as `<name>.orig`
+    for `retention` seconds.
+    """
+
+    TEMP_MARKER = '.ytdl-tmp'
+
+    def __init__(self, backup_policy: Optional[str] = None, retention: Optional[float] = None):
+        self.backup_policy = (backup_policy or os.environ.get('YTDL_BACKUP_POLICY', 'none')).lower()
+        self.retention = float(retention if retention is not None
+                               else os.environ.get('YTDL_BACKUP_RETENTION', 24 * 3600))
+
+    def temp_path(self, target: Path) -> Path:
+        """Hidden temp path next to target; keeps the suffix so ffmpeg picks the right muxer."""
+        return target.with_name(f".{target.stem}.{os.getpid()}-{threading.get_ident()}{self.TEMP_MARKER}{target.suffix}")
+
+    @contextmanager
+    def staging(self, target: Path):
+        """Yield a temp path for target; it is removed unless committed."""
+        tmp = self.temp_path(target)
+        try:
+            yield tmp
+        finally:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _fsync(path: Path, directory: bool = False) -> None:
+        if directory and os.name == 'nt':
+            return
+        try:
+            fd = os.open(str(path), os.O_RDONLY if directory else os.O_RDWR)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def commit(self, tmp: Path, target: Path, replaces: Optional[Path] = None) -> Path:
+        """Atomically move tmp to target, applying the backup policy to `replaces`."""
+        self._fsync(tmp)
+        if replaces is not None and replaces.exists():
+            if self.backup_policy == 'keep':
+                replaces.replace(replaces.with_name(replaces.name + '.orig'))
+            elif replaces != target:
+                replaces.unlink()
+        os.replace(str(tmp), str(target))
+        self._fsync(target.parent, directory=True)
+        if self.backup_policy == 'keep':
+            self.prune_backups(target.parent)
+        return target
+
+    def prune_backups(self, directory: Path) -> int:
+        """Delete `.orig` backups older than the retention period; returns the count removed."""
+        removed = 0
+        cutoff = time.time() - self.retention
+        for backup in Path(directory).glob('*.orig'):
+            try:
+                if backup.stat().st_mtime < cutoff:
+                    backup.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+class StorageManager:
+    """Byte quota for the downloads directory with watermark-driven LRU eviction.
+
+    When usage crosses the high watermark, completed files are evicted in order of
+    last access (recorded when they are served) until usage drops below the low
+    watermark. Pinned files and files currently being served are never evicted.
+    The sweep also removes orphaned partial and temp files left by crashed jobs.
+    """
+
+    STATE_FILE = '.ytdl_storage.json'
+    ORPHAN_SUFFIXES = ('.part', '.ytdl', '.orig')
+    STAGING_PREFIX = 'ytdl-'
+
+    _instances: Dict[str, 'StorageManager'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, directory: str, quota_bytes: Optional[int] = None,
+                 high_watermark: Optional[float] = None, low_watermark: Optional[float] = None,
+                 orphan_age: Optional[float] = None):
+        self.directory = Path(directory)
+        self.quota_bytes = quota_bytes if quota_bytes is not None else int(
+            float(os.environ.get('YTDL_STORAGE_QUOTA_MB', 0)) * 1024 * 1024)
+        self.high_watermark = float(high_watermark if high_watermark is not None
+                                    else os.environ.get('YTDL_STORAGE_HIGH_WATERMARK', 0.9))
+        self.low_watermark = float(low_watermark if low_watermark is not None
+                                   else os.environ.get('YTDL_STORAGE_LOW_WATERMARK', 0.75))
+        self.orphan_age = float(orphan_age if orphan_age is not None
+                                else os.environ.get('YTDL_ORPHAN_MAX_AGE', 6 * 3600))
+        self.staging_dir_on_disk = Path(os.environ.get('YTDL_STAGING_DIR') or self.directory / '.staging')
+        self.ram_staging_dir = Path(os.environ.get('YTDL_RAM_STAGING_DIR', '/dev/shm'))
+        self.ram_staging_max = int(float(os.environ.get('YTDL_RAM_STAGING_MAX_MB', 256)) * 1024 * 1024)
+        self.staging_roots: List[Path] = [self.staging_dir_on_disk, self.ram_staging_dir, Path(tempfile.gettempdir())]
+        self._lock = threading.RLock()
+        self._space_freed = threading.Condition(self._lock)
+        self._reservations: Dict[str, int] = {}
+        self._serving: Dict[str, int] = {}
+        self._protected = None
+        self._last_sweep: Optional[Dict[str, Any]] = None
+        self._worker: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        state = self._load_state()
+        self._access: Dict[str, float] = state.get('access', {})
+        self._pins = set(state.get('pins', []))
+
+    @classmethod
+    def for_directory(cls, directory: str) -> 'StorageManager':
+        """Return the manager shared by everything writing into directory."""
+        key = str(Path(directory).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(directory)
+            return cls._instances[key]
+
+    def _key(self, path) -> str:
+        return Path(path).name
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.directory / self.STATE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        state_path = self.directory / self.STATE_FILE
+        tmp = state_path.with_name(state_path.name + f'.{os.getpid()}')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'access': self._access, 'pins': sorted(self._pins)}, f)
+            os.replace(tmp, state_path)
+        except OSError:
+            pass
+
+    def set_protected(self, provider) -> None:
+        """provider() returns paths owned by running jobs; they are never swept or evicted."""
+        self._protected = provider
+
+    def touch(self, path) -> None:
+        """Record an access (a file being served) for LRU ordering."""
+        with self._lock:
+            self._access[self._key(path)] = time.time()
+            self._save_state()
+
+    def pin(self, path) -> None:
+        with self._lock:
+            self._pins.add(self._key(path))
+            self._save_state()
+
+    def unpin(self, path) -> None:
+        with self._lock:
+            self._pins.discard(self._key(path))
+            self._save_state()
+
+    def acquire(self, path) -> None:
+        """Mark path as being served; pair with release() when the response closes."""
+        key = self._key(path)
+        with self._lock:
+            self._serving[key] = self._serving.get(key, 0) + 1
+            self._access[key] = time.time()
+
+    def release(self, path) -> None:
+        key = self._key(path)
+        with self._lock:
+            count = self._serving.get(key, 0) - 1
+            if count > 0:
+                self._serving[key] = count
+            else:
+                self._serving.pop(key, None)
+            self._save_state()
+
+    def _protected_names(self) -> set:
+        names = set()
+        if self._protected:
+            try:
+                names = {Path(p).name for p in self._protected() if p}
+            except Exception:
+                names = set()
+        return names
+
+    def _is_orphan_name(self, name: str) -> bool:
+        return (name.endswith(self.ORPHAN_SUFFIXES) or OutputFinalizer.TEMP_MARKER in name
+                or '.part-Frag' in name or '.temp.' in name)
+
+    def _scan(self) -> Tuple[List[Tuple[Path, os.stat_result]], int]:
+        """Completed output files and total bytes used (including partial files)."""
+        files = []
+        total = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return files, 0
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            total += st.st_size
+            if entry.name == self.STATE_FILE or entry.name.startswith('.') or self._is_orphan_name(entry.name):
+                continue
+            files.append((Path(entry.path), st))
+        return files, total
+
+    def limit(self) -> int:
+        """Effective byte limit: the configured quota, capped by what the filesystem can hold."""
+        _, used = self._scan()
+        try:
+            capacity = used + shutil.disk_usage(self.directory).free
+        except OSError:
+            capacity = used
+        return min(self.quota_bytes, capacity) if self.quota_bytes > 0 else capacity
+
+    def staging_root(self, expected_bytes: Optional[int]) -> Path:
+        """Pick where a job's intermediate streams go.
+
+        Small jobs use RAM-backed tmp (YTDL_RAM_STAGING_DIR, /dev/shm by default)
+        when it has room to spare; everything else, including jobs of unknown
+        size, stages on the same filesystem as the downloads so the final step
+        is a rename instead of a cross-filesystem copy.
+        """
+        if (expected_bytes and expected_bytes <= self.ram_staging_max
+                and self.ram_staging_dir.is_dir() and os.access(self.ram_staging_dir, os.W_OK)):
+            try:
+                # Leave headroom: tmpfs pages compete with the rest of the system for memory
+                if shutil.disk_usage(self.ram_staging_dir).free >= expected_bytes * 2:
+                    return self.ram_staging_dir
+            except OSError:
+                pass
+        self.staging_dir_on_disk.mkdir(parents=True, exist_ok=True)
+        return self.staging_dir_on_disk
+
+    def staging_dir(self, expected_bytes: Optional[int] = None) -> tempfile.TemporaryDirectory:
+        """Temporary directory for a job's intermediate files, placed by staging_root()."""
+        root = self.staging_root(expected_bytes)
+        return tempfile.TemporaryDirectory(prefix=self.STAGING_PREFIX, dir=str(root))
+
+    def capacity(self) -> int:
+        """Most bytes a single job can ever be granted (the high watermark of the limit)."""
+        return int(self.limit() * self.high_watermark)
+
+    def sweep_orphans(self) -> List[str]:
+        """Remove stale partial/temp files and staging dirs of crashed jobs."""
+        removed = []
+        cutoff = time.time() - self.orphan_age
+        protected = self._protected_names()
+        for path in self.directory.glob('*'):
+            try:
+                if (path.is_file() and self._is_orphan_name(path.name) and path.name not in protected
+                        and path.stat().st_mtime < cutoff):
+                    path.unlink()
+                    removed.append(path.name)
+            except OSError:
+                continue
+        for root in self.staging_roots:
+            for staging_dir in Path(root).glob(f'{self.STAGING_PREFIX}*'):
+                try:
+                    # Judge by the newest entry: a long-running job keeps writing into its dir
+                    if staging_dir.is_dir() and max([staging_dir.stat().st_mtime] + [
+                            p.stat().st_mtime for p in staging_dir.iterdir()]) < cutoff:
+                        shutil.rmtree(staging_dir, ignore_errors=True)
+                        removed.append(str(staging_dir))
+                except OSError:
+                    continue
+        return removed
+
+    def enforce(self, need: int = 0) -> List[str]:
+        """Evict least recently used outputs once usage is above the high watermark.
+
+        Reserved space and `need` extra bytes count as used, so admission control
+        can ask for room before a job starts writing.
+        """
+        with self._lock:
+            files, used = self._scan()
+            limit = self.limit()
+            used += sum(self._reservations.values()) + need
+            if limit <= 0 or used <= limit * self.high_watermark:
+                return []
+            target = limit * self.low_watermark
+            protected = self._protected_names()
+            candidates = [(p, st) for p, st in files
+                          if p.name not in self._pins and p.name not in self._serving and p.name not in protected]
+            candidates.sort(key=lambda item: self._access.get(item[0].name, item[1].st_mtime))
+            evicted = []
+            for path, st in candidates:
+                if used <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                used -= st.st_size
+                self._access.pop(path.name, None)
+                evicted.append(path.name)
+            if evicted:
+                print(f"{Fore.YELLOW}🧹 Storage: evicted {len(evicted)} file(s) to stay under quota")
+                self._save_state()
+            return evicted
+
+    def reserve(self, job_id: str, nbytes: Optional[int], timeout: Optional[float] = None,
+                on_wait=None) -> bool:
+        """Admission control: reserve nbytes for job_id before it starts writing.
+
+        Evicts LRU files to make room when possible, otherwise waits (up to
+        timeout) for running jobs to release their reservations; on_wait() is
+        called once when the job has to queue. Raises OSError(ENOSPC) when the
+        job can never fit and returns False when the wait times out. Unknown
+        sizes (None) are admitted without a reservation.
+        """
+        if not nbytes:
+            return True
+        if timeout is None:
+            timeout = float(os.environ.get('YTDL_ADMISSION_TIMEOUT', 600))
+        deadline = time.time() + timeout
+        waited = False
+        with self._space_freed:
+            while True:
+                capacity = self.capacity()
+                if nbytes > capacity:
+                    raise OSError(errno.ENOSPC, f"Job needs about {nbytes // (1024 * 1024)} MB but only "
+                                                f"{capacity // (1024 * 1024)} MB can ever be available")
+                _, used = self._scan()
+                if used + sum(self._reservations.values()) + nbytes <= capacity:
+                    self._reservations[job_id] = nbytes
+                    return True
+                if self.enforce(need=nbytes):
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                if not waited and on_wait:
+                    on_wait()
+                waited = True
+                # Re-check periodically as well: space can also be freed outside this process
+                self._space_freed.wait(min(remaining, 5.0))
+
+    def release_reservation(self, job_id: str) -> None:
+        with self._space_freed:
+            if self._reservations.pop(job_id, None) is not None:
+                self._space_freed.notify_all()
+
+    def run_once(self) -> Dict[str, Any]:
+        removed = self.sweep_orphans()
+        evicted = self.enforce()
+        self._last_sweep = {'at': time.time(), 'orphans_removed': removed, 'evicted': evicted}
+        if removed or evicted:
+            with self._space_freed:
+                self._space_freed.notify_all()
+        return self._last_sweep
+
+    def request_sweep(self) -> None:
+        """Ask the background worker for an early pass (e.g. after a job finishes)."""
+        self._wake.set()
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Run sweep + eviction periodically on a daemon thread."""
+        interval = interval or float(os.environ.get('YTDL_STORAGE_SWEEP_INTERVAL', 300))
+        if self._worker and self._worker.is_alive():
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"{Fore.YELLOW}⚠️  Storage sweep failed: {e}")
+                self._wake.wait(interval)
+                self._wake.clear()
+
+        self._worker = threading.Thread(target=loop, name='ytdl-storage', daemon=True)
+        self._worker.start()
+
+    def status(self) -> Dict[str, Any]:
+        files, used = self._scan()
+        limit = self.limit()
+        with self._lock:
+            entries = sorted(({
+                'filename': p.name,
+                'size': st.st_size,
+                'last_access': self._access.get(p.name, st.st_mtime),
+                'pinned': p.name in self._pins,
+                'serving': self._serving.get(p.name, 0),
+            } for p, st in files), key=lambda e: e['last_access'])
+        return {
+            'directory': str(self.directory.resolve()),
+            'used_bytes': used,
+            'limit_bytes': limit,
+            'quota_bytes': self.quota_bytes,
+            'high_watermark': self.high_watermark,
+            'low_watermark': self.low_watermark,
+            'reserved_bytes': sum(self._reservations.values()),
+            'reservations': dict(self._reservations),
+            'usage_ratio': used / limit if limit else None,
+            'files': entries,
+            'last_sweep': self._last_sweep,
+        }
+
+class ThumbnailCache:
+    """Local LRU cache of thumbnails keyed by video ID, shared by the web preview and cover embedding.
+
+    Images live in a cache directory bounded by size; a tiny `.src` sidecar keeps
+    the origin URL so an evicted image can be fetched again on demand.
+    """
+
+    IMAGE_TYPES = {b'\xff\xd8': ('.jpg', 'image/jpeg'), b'\x89PNG': ('.png', 'image/png'),
+                   b'RIFF': ('.webp', 'image/webp'), b'GIF8': ('.gif', 'image/gif')}
+    SOURCE_TTL = 30 * 24 * 3600
+
+    _shared: Optional['ThumbnailCache'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        default_dir = Path(tempfile.gettempdir()) / 'ytdl_thumbnails'
+        self.directory = Path(directory or os.environ.get('YTDL_THUMBNAIL_CACHE_DIR') or default_dir)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.environ.get('YTDL_THUMBNAIL_CACHE_MB', 64)) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._index: 'OrderedDict[str, Path]' = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, threading.Event] = {}
+        self._load()
+
+    @classmethod
+    def shared(cls) -> 'ThumbnailCache':
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def key_for(video_id: Optional[str], url: Optional[str] = None) -> Optional[str]:
+        """Filesystem-safe cache key: the video ID, or a hash of the URL when there is none."""
+        if video_id:
+            return re.sub(r'[^\w-]', '_', str(video_id))[:128]
+        if url:
+            import hashlib
+            return 'url-' + hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+        return None
+
+    @classmethod
+    def content_type(cls, path: Path) -> str:
+        for suffix, mimetype in cls.IMAGE_TYPES.values():
+            if path.suffix == suffix:
+                return mimetype
+        return 'application/octet-stream'
+
+    def _load(self) -> None:
+        """Rebuild the LRU index from disk, oldest access first."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            images = [p for p in self.directory.iterdir() if p.suffix in {s for s, _ in self.IMAGE_TYPES.values()}]
+            images.sort(key=lambda p: p.stat().st_mtime)
+        except OSError:
+            return
+        for image in images:
+            self._index[image.stem] = image
+            self._size += image.stat().st_size
+
+    def remember(self, video_id: Optional[str], url: Optional[str]) -> Optional[str]:
+        """Record the origin URL for a video so its thumbnail can be served locally; returns the key."""
+        key = self.key_for(video_id, url)
+        if key and url:
+            try:
+                (self.directory / f"{key}.src").write_text(url, encoding='utf-8')
+            except OSError:
+                pass
+        return key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the cached image for key (marking it recently used) or None."""
+        with self._lock:
+            path = self._index.get(key)
+            if path is None:
+                return None
+            if not path.exists():
+                self._drop(key)
+                return None
+            self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get(self, video_id: Optional[str], url: Optional[str] = None) -> Optional[Path]:
+        """Return a local copy of the thumbnail, fetching it once on a miss."""
+        key = self.key_for(video_id, url)
+        if not key:
+            return None
+        cached = self.lookup(key)
+        if cached:
+            return cached
+        if url:
+            self.remember(video_id, url)
+        else:
+            try:
+                url = (self.directory / f"{key}.src").read_text(encoding='utf-8').strip()
+            except OSError:
+                return None
+
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            # Another thread is already fetching this thumbnail
+            event.wait(timeout=20)
+            return self.lookup(key)
+        try:
+            data = self._fetch(url)
+            return self._store(key, data) if data else None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    @staticmethod
+    def _fetch(url: str) -> Optional[bytes]:
+        try:
+            import urllib.request
+            request = urllib.request.Request(url, headers={'User-Agent': ErrorHandler.get_fallback_user_agents()[0]})
+            with urllib.request.urlopen(request, timeout=15) as response:
+                return response.read()
+        except Exception:
+            return None
+
+    def _store(self, key: str, data: bytes) -> Optional[Path]:
+        suffix = next((s for magic, (s, _) in self.IMAGE_TYPES.items() if data.startswith(magic)), None)
+        if suffix is None or len(data) > self.max_bytes:
+            return None
+        path = self.directory / f"{key}{suffix}"
+        try:
+            tmp = self.directory / f".{key}.{threading.get_ident()}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            return None
+        with self._lock:
+            self._drop(key)
+            self._index[key] = path
+            self._size += len(data)
+            self._evict()
+        return path
+
+    def _drop(self, key: str) -> None:
+        path = self._index.pop(key, None)
+        if path is not None:
+            try:
+                self._size -= path.stat().st_size
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        """Remove least recently used images until the cache fits its budget (lock held)."""
+        while self._size > self.max_bytes and self._index:
+            _, path = self._index.popitem(last=False)
+            try:
+                self._size -= path.stat().st_size
+                path.unlink()
+            except OSError:
+                pass
+        cutoff = time.time() - self.SOURCE_TTL
+        for source in self.directory.glob('*.src'):
+            try:
+                if source.stat().st_mtime < cutoff:
+                    source.unlink()
+            except OSError:
+                continue
+
+class ValidationPipeline:
+    """Post-download validation stage running on a dedicated bounded worker pool.
+
+    Probe results are cached per file keyed by (path, size, mtime), so a file is
+    only probed again once its contents change.
+    """
+
+    CACHE_SIZE = 512
+
+    _shared: Optional['ValidationPipeline'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: Optional[int] = None):
+        workers = max_workers or int(os.environ.get('YTDL_VALIDATION_WORKERS', '2'))
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix='ytdl-validate')
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[Tuple[str, int, int], Dict[str, Any]]' = OrderedDict()
+        self._pending: Dict[str, concurrent.futures.Future] = {}
+
+    @classmethod
+    def shared(cls) -> 'ValidationPipeline':
+        """Return the pipeline shared by all downloader instances in this process."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def _cache_key(path: Path) -> Optional[Tuple[str, int, int]]:
+        try:
+            st = path.stat()
+            return (str(path.resolve()), st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def probe(self, path: Path, prober) -> Dict[str, Any]:
+        """Return media info for path, running prober(path) only on a cache miss."""
+        key = self._cache_key(path)
+        if key is None:
+            return {}
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        info = prober(path)
+        if info:
+            with self._lock:
+                self._cache[key] = info
+                while len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return info
+
+    def submit(self, filename: str, validate, callback=None) -> concurrent.futures.Future:
+        """Queue validate(filename) once per file; callback(result) runs on completion."""
+        with self._lock:
+            future = self._pending.get(filename)
+            if future is None:
+                # Copy the caller's context so log records keep the job ID
+                future = self._executor.submit(contextvars.copy_context().run, validate, filename)
+                self._pending[filename] = future
+                future.add_done_callback(lambda _f, name=filename: self._done(name))
+        if callback:
+            future.add_done_callback(lambda f: callback(None if f.exception() else f.result()))
+        return future
+
+    def _done(self, filename: str) -> None:
+        with self._lock:
+            self._pending.pop(filename, None)
+
+class AudioEncoderPool:
+    """Bounded pool for explicit audio transcodes; copy-only audio jobs never enter it."""
+
+    # Preferred ffmpeg encoders per target codec, best first
+    ENCODERS = {
+        'mp3': ['libmp3lame'],
+        'aac': ['libfdk_aac', 'aac'],
+        'opus': ['libopus', 'opus'],
+        'vorbis': ['libvorbis', 'vorbis'],
+        'flac': ['flac'],
+    }
+
+    _shared: Optional['AudioEncoderPool'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: Optional[int] = None, registry: Optional[ToolchainRegistry] = None):
+        default_workers = max(1, (os.cpu_count() or 2) // 2)
+        self.max_workers = max(1, max_workers or int(os.environ.get('YTDL_AUDIO_ENCODERS', default_workers)))
+        self.registry = registry or ToolchainRegistry.shared()
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+
+    @classmethod
+    def shared(cls) -> 'AudioEncoderPool':
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def encoder_for(self, codec: str) -> Optional[str]:
+        """Best available encoder for codec according to the toolchain registry."""
+        candidates = self.ENCODERS.get(codec)
+        if not candidates:
+            return None
+        for encoder in candidates:
+            if self.registry.has_encoder(encoder):
+                return encoder
+        # Encoder list unknown (probe failed) - fall back to ffmpeg's native encoder
+        return candidates[-1]
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the pool's encoder slots for the duration of a transcode."""
+        with self._slots:
+            yield
+
+class SinglePassPostProcessor(PostProcessor):
+    """yt-dlp postprocessor that tags, embeds the cover and applies faststart in one ffmpeg pass."""
+
+    def __init__(self, owner: 'YouTubeDownloader', audio_only: bool = False, downloader=None):
+        super().__init__(downloader)
+        self.owner = owner
+        self.audio_only = audio_only
+
+    @timed_stage('postprocess')
+    def run(self, information):
+        filepath = information.get('filepath')
+        if filepath and self.owner.merger.ffmpeg_available:
+            if self.audio_only:
+                information['filepath'] = str(self.owner._finalize_audio(Path(filepath), information))
+            else:
+                self.owner._ffmpeg_single_pass([filepath], Path(filepath), information)
+        return [], information
+
 class YouTubeDownloader:
     """
     Ultimate YouTube downloader combining all best practices.
     Supports both standard and ultra modes with intelligent fallbacks.
     """
+
+    # Extracted info per URL, shared so preview, admission control and the download reuse one extraction
+    INFO_CACHE_TTL = float(os.environ.get('YTDL_INFO_CACHE_TTL', 600))
+    INFO_CACHE_SIZE = 64
+    _info_cache: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+    _info_cache_lock = threading.Lock()
     
     def __init__(self, download_path: str = "./downloads", insecure_ssl: bool = False):
         self.download_path = Path(download_path)
         self.download_path.mkdir(exist_ok=True)
         self.merger = VideoMerger()
+        self.validator = ValidationPipeline.shared()
+        self.finalizer = OutputFinalizer()
+        self.storage = StorageManager.for_directory(str(self.download_path))
+        self.metrics = MetricsRegistry.shared()
+        self.thumbnails = ThumbnailCache.shared()
         self.error_handler = ErrorHandler()
         self.progress_hook_callback = None
         self.audio_language = None  # Selected audio language
+        self.audio_format: Optional[str] = None  # Target audio codec; None keeps the source codec
+        self.audio_quality = '192k'  # Bitrate used when transcoding to a lossy codec
         # If true, pass nocheckcertificate=True to yt-dlp options (insecure)
         self.insecure_ssl = bool(insecure_ssl)
     
@@ -275,91 +1370,107 @@ class YouTubeDownloader:
         # Abort download if cancelled
         if self._is_cancelled():
             raise Exception("Download cancelled by user")
-        # When a file is finished, validate container metadata and fix if needed
-        try:
-            if d.get('status') in ('finished', 'done') and d.get('filename'):
-                try:
-                    fixed = self._validate_and_fix_file(d['filename'])
-                    if fixed and fixed != d['filename']:
-                        # Update filename in the progress dict so callers see corrected path
-                        d = dict(d)
-                        d['filename'] = fixed
-                except Exception:
-                    # Non-fatal - continue and report original
-                    pass
-        except Exception:
-            pass
-
         if self.progress_hook_callback:
             self.progress_hook_callback(d)
 
-    def _validate_and_fix_file(self, filename: str) -> Optional[str]:
-        """Check media metadata (duration, resolution). If invalid, try to remux with ffmpeg.
+    def _output_ready_hook(self, filename: str) -> None:
+        """yt-dlp post hook: runs once per final output, after all postprocessors."""
+        if self.progress_hook_callback:
+            size = os.path.getsize(filename) if os.path.exists(filename) else 0
+            self.progress_hook_callback({
+                'status': 'finished',
+                'final': True,
+                'filename': filename,
+                'downloaded_bytes': size,
+                'total_bytes': size,
+            })
+        self._submit_validation(filename)
+        self._settle_storage()
+
+    def _submit_validation(self, filename: str) -> None:
+        """Hand a finished output to the validation pipeline without blocking the download."""
+        download_id = getattr(self, 'download_id', None)
+        callback = self.progress_hook_callback
 
-        Returns the path to a validated file (may be same as input) or None on failure.
+        def report(result: Optional[Dict[str, Any]]) -> None:
+            if callback and result:
+                callback({'status': 'validated', 'download_id': download_id, **result})
+
+        self.validator.submit(filename, self._validate_and_fix_file, report)
+
+    def _settle_storage(self) -> None:
+        """Output is on disk: drop the job's space reservation and re-check the quota."""
+        job_id = getattr(self, 'download_id', None)
+        if job_id:
+            self.storage.release_reservation(job_id)
+        self.storage.enforce()
+
+    @timed_stage('validate')
+    def _validate_and_fix_file(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Check media metadata (duration, resolution). If a check fails, try to remux with ffmpeg.
+
+        Returns {'filename': validated_path, 'media_info': {...}} or None on failure.
         """
         try:
             path = Path(filename)
             if not path.exists():
                 return None
 
-            # Run ffprobe to get duration and stream info
-            info = self._ffprobe(path)
+            info = self.validator.probe(path, self._ffprobe)
+            if not info:
+                # Nothing to check against (ffprobe missing or unreadable file)
+                return {'filename': str(path), 'media_info': {}}
+
             duration = info.get('duration', 0)
-            width = info.get('width', 0)
-
-            # If duration or width are missing/zero, attempt to remux to mp4
-            if (not duration or duration <= 0) or (not width or width <= 0):
-                # Choose target path with .mp4 extension in same dir
-                target = path.with_suffix('.mp4')
-                # If target exists, append suffix
-                if target.exists():
-                    target = path.with_name(path.stem + '_fixed.mp4')
-
-                ok = self._remux_to_mp4(str(path), str(target))
-                if ok and Path(target).exists():
-                    try:
-                        # Replace original file with fixed file if appropriate
-                        # Keep original as backup with .orig suffix
-                        backup = path.with_suffix(path.suffix + '.orig')
-                        if not backup.exists():
-                            path.replace(backup)
-                        Path(target).replace(path)
-                        return str(path)
-                    except Exception:
-                        return str(target)
-            return str(path)
+            bad_duration = not duration or duration <= 0
+            bad_resolution = info.get('vcodec') is not None and not info.get('width')
+            if not (bad_duration or bad_resolution):
+                return {'filename': str(path), 'media_info': info}
+
+            # Remux straight into a temp file beside the target, then rename over the original
+            target = path.with_suffix('.mp4')
+            if target != path and target.exists():
+                target = path.with_name(path.stem + '_fixed.mp4')
+
+            with self.finalizer.staging(target) as tmp:
+                if self._remux_to_mp4(str(path), str(tmp)) and tmp.exists():
+                    fixed = self.finalizer.commit(tmp, target, replaces=path)
+                    return {'filename': str(fixed), 'media_info': self.validator.probe(fixed, self._ffprobe)}
+            return {'filename': str(path), 'media_info': info}
         except Exception:
             return None
 
     def _ffprobe(self, path: Path) -> Dict[str, Any]:
-        """Run ffprobe (using detected ffmpeg path) and return parsed basic info."""
+        """Run ffprobe (using detected ffprobe path) and return duration, resolution and codecs."""
         try:
-            ffmpeg_cmd = getattr(self.merger, 'ffmpeg_path', 'ffmpeg')
-            cmd = [ffmpeg_cmd.replace('ffmpeg', 'ffprobe'), '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', str(path)]
+            ffprobe_cmd = getattr(self.merger, 'ffprobe_path', None)
+            if not ffprobe_cmd:
+                return {}
+            cmd = [ffprobe_cmd, '-v', 'error', '-show_entries', 'stream=codec_type,codec_name,width,height',
+                   '-show_entries', 'format=duration', '-of', 'json', str(path)]
             result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=15)
-            out = result.stdout.strip().splitlines()
-            info: Dict[str, Any] = {}
-            if out:
-                # Expect duration, width, height in some order; try to parse
-                try:
-                    # If three lines: duration, width, height
-                    if len(out) >= 3:
-                        info['duration'] = float(out[0]) if out[0] else 0
-                        info['width'] = int(out[1]) if out[1] else 0
-                        info['height'] = int(out[2]) if out[2] else 0
-                    elif len(out) == 2:
-                        info['duration'] = float(out[0]) if out[0] else 0
-                        info['width'] = int(out[1]) if out[1] else 0
-                        info['height'] = 0
-                    else:
-                        info['duration'] = float(out[0]) if out[0] else 0
-                except Exception:
-                    pass
+            if result.returncode != 0:
+                return {}
+            data = json.loads(result.stdout or '{}')
+            info: Dict[str, Any] = {
+                'duration': float(data.get('format', {}).get('duration') or 0),
+                'width': 0,
+                'height': 0,
+                'vcodec': None,
+                'acodec': None,
+            }
+            for stream in data.get('streams', []):
+                if stream.get('codec_type') == 'video' and info['vcodec'] is None:
+                    info['vcodec'] = stream.get('codec_name')
+                    info['width'] = int(stream.get('width') or 0)
+                    info['height'] = int(stream.get('height') or 0)
+                elif stream.get('codec_type') == 'audio' and info['acodec'] is None:
+                    info['acodec'] = stream.get('codec_name')
             return info
         except Exception:
             return {}
 
+    @timed_stage('remux')
     def _remux_to_mp4(self, src: str, dst: str) -> bool:
         """Use ffmpeg to remux/copy streams into an MP4 container with faststart."""
         try:
@@ -370,8 +1481,78 @@ class YouTubeDownloader:
         except Exception:
             return False
             
+    @classmethod
+    def _cached_info(cls, url: str) -> Optional[Dict[str, Any]]:
+        with cls._info_cache_lock:
+            entry = cls._info_cache.get(url)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > cls.INFO_CACHE_TTL:
+                # Format URLs expire, so stale entries are dropped rather than reused
+                del cls._info_cache[url]
+                return None
+            cls._info_cache.move_to_end(url)
+            return entry[1]
+
+    @classmethod
+    def _remember_info(cls, url: str, info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if info:
+            with cls._info_cache_lock:
+                cls._info_cache[url] = (time.time(), info)
+                cls._info_cache.move_to_end(url)
+                while len(cls._info_cache) > cls.INFO_CACHE_SIZE:
+                    cls._info_cache.popitem(last=False)
+        return info
+
+    @staticmethod
+    def _format_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[int]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and duration and fmt.get('tbr'):
+            size = fmt['tbr'] * 1000 / 8 * duration
+        return int(size) if size else None
+
+    def estimate_required_bytes(self, info: Dict[str, Any], quality: str = 'best',
+                                audio_only: bool = False) -> Optional[int]:
+        """Peak disk space a job needs, from the formats' filesize/filesize_approx.
+
+        Source streams and the merged/remuxed output exist at the same time, so
+        the peak is about twice the selected streams. None when sizes are unknown.
+        """
+        formats = info.get('formats') or [info]
+        duration = info.get('duration')
+        quality_heights = {'best': 2160, '4k': 2160, '1440p': 1440, '1080p': 1080,
+                           '720p': 720, '480p': 480, '360p': 360}
+        target_height = quality_heights.get(quality.lower(), 1080)
+        sized = [(f, self._format_size(f, duration)) for f in formats]
+        audio = [(f, s) for f, s in sized if s and f.get('acodec') not in (None, 'none')
+                 and f.get('vcodec') in (None, 'none')]
+        best_audio = max(audio, key=lambda x: x[0].get('abr') or x[0].get('tbr') or 0)[1] if audio else None
+        if audio_only:
+            return int(best_audio * 2 * 1.05) if best_audio else None
+
+        # Same preference as _select_formats: closest to the target height, then bitrate
+        def closest(candidates):
+            return min(candidates, key=lambda x: (abs((x[0].get('height') or 0) - target_height),
+                                                  -(x[0].get('height') or 0), -(x[0].get('tbr') or 0)))[1]
+
+        video = [(f, s) for f, s in sized if s and f.get('height') and f.get('vcodec') not in (None, 'none')
+                 and f.get('acodec') in (None, 'none')]
+        if video and best_audio and self.merger.ffmpeg_available:
+            streams = closest(video) + best_audio
+        else:
+            combined = [(f, s) for f, s in sized if s and f.get('vcodec') not in (None, 'none')
+                        and f.get('acodec') not in (None, 'none')]
+            if not combined:
+                return None
+            streams = closest(combined)
+        return int(streams * 2 * 1.05)
+
+    @timed_stage('extract')
     def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
         """Get video information for web interface compatibility with improved error handling."""
+        cached = self._cached_info(url)
+        if cached:
+            return cached
         try:
             base_opts = {
                 'quiet': True,
@@ -404,7 +1585,7 @@ class YouTubeDownloader:
 
             with yt_dlp.YoutubeDL(opts) as ydl:
                 info = ydl.extract_info(url, download=False)
-                return info
+                return self._remember_info(url, info)
                 
         except Exception as e:
             err_str = str(e)
@@ -413,6 +1594,7 @@ class YouTubeDownloader:
             # If it's an SSL certificate verification issue, try with nocheckcertificate
             if self._is_ssl_error(err_str) and not self.insecure_ssl:
                 print(f"{Fore.YELLOW}⚠️  SSL certificate verification failed. Retrying with 'nocheckcertificate'=True (insecure).")
+                self.metrics.inc('ytdl_ssl_fallback_total', help='Retries with certificate checks disabled', stage='extract')
                 try:
                     ssl_opts = base_opts.copy()
                     ssl_opts['nocheckcertificate'] = True
@@ -425,7 +1607,7 @@ class YouTubeDownloader:
                     with yt_dlp.YoutubeDL(ssl_opts) as ydl:
                         info = ydl.extract_info(url, download=False)
                         print(f"{Fore.GREEN}✅ Retrieved info using nocheckcertificate fallback")
-                        return info
+                        return self._remember_info(url, info)
                 except Exception as ssl_e:
                     print(f"{Fore.RED}❌ SSL-fallback failed: {ssl_e}")
 
@@ -440,7 +1622,7 @@ class YouTubeDownloader:
                 }
                 with yt_dlp.YoutubeDL(fallback_opts) as ydl:
                     info = ydl.extract_info(url, download=False)
-                    return info
+                    return self._remember_info(url, info)
             except Exception as fallback_e:
                 print(f"{Fore.RED}❌ Fallback also failed: {fallback_e}")
                 return None
@@ -467,7 +1649,10 @@ class YouTubeDownloader:
         print(f"{Fore.CYAN}📺 Quality: {quality}")
         
         if audio_only:
-            return self._download_audio_only(url, output_name)
+            success = self._download_audio_only(url, output_name)
+            self.metrics.inc('ytdl_jobs_total', help='Finished download jobs', mode='audio',
+                             result='success' if success else 'failure')
+            return success
         
         # Determine best mode
         if mode == "auto":
@@ -492,9 +1677,12 @@ class YouTubeDownloader:
                 pass  # If check fails, continue with original mode
                 
         if mode == "ultra" and self.merger.available:
-            return self._download_ultra_mode(url, quality, output_name)
+            success = self._download_ultra_mode(url, quality, output_name)
         else:
-            return self._download_standard_mode(url, quality, output_name)
+            success = self._download_standard_mode(url, quality, output_name)
+        self.metrics.inc('ytdl_jobs_total', help='Finished download jobs', mode=mode,
+                         result='success' if success else 'failure')
+        return success
     
     def _download_ultra_mode(self, url: str, quality: str, output_name: Optional[str]) -> bool:
         """Ultra mode with separate stream downloading and Python merging."""
@@ -514,13 +1702,14 @@ class YouTubeDownloader:
             if self._is_cancelled():
                 print(f"{Fore.YELLOW}⚠️  Download cancelled (ultra mode)")
                 return False
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Get video info
-                video_info = self._get_video_info(url)
-                if not video_info:
-                    print(f"{Fore.RED}❌ Failed to get video info")
-                    return False
-                
+            # Get video info first so the staging area can be chosen by size
+            video_info = self._get_video_info(url)
+            if not video_info:
+                print(f"{Fore.RED}❌ Failed to get video info")
+                return False
+            required = self.estimate_required_bytes(video_info, quality)
+            # The staging dir only holds the source streams, about half of the peak estimate
+            with self.storage.staging_dir(required // 2 if required else None) as temp_dir:
                 title = video_info.get('title', 'video')
                 print(f"{Fore.GREEN}📺 {title}")
                 
@@ -540,10 +1729,15 @@ class YouTubeDownloader:
                         print(f"{Fore.YELLOW}🔄 Merging streams...")
                         if self.merger.ffmpeg_available:
                             print(f"{Fore.CYAN}Using FFmpeg for merging...")
-                            success = self._merge_with_ytdlp(video_file, audio_file, str(output_path))
+                            # Merge, tags, cover and faststart in a single rewrite of the output
+                            with self.metrics.span('merge'):
+                                success = self._ffmpeg_single_pass([video_file, audio_file], output_path, video_info)
                         elif self.merger.available:
                             print(f"{Fore.CYAN}Using MoviePy for merging...")
-                            success = self.merger.merge_streams(video_file, audio_file, str(output_path))
+                            with self.finalizer.staging(output_path) as merge_target, self.metrics.span('merge'):
+                                success = self.merger.merge_streams(video_file, audio_file, str(merge_target))
+                                if success:
+                                    self.finalizer.commit(merge_target, output_path)
                         else:
                             print(f"{Fore.RED}❌ No merging capability available!")
                             success = False
@@ -553,11 +1747,14 @@ class YouTubeDownloader:
                             if hasattr(self, 'progress_hook_callback') and self.progress_hook_callback:
                                 completion_data = {
                                     'status': 'finished',
+                                    'final': True,
                                     'filename': str(output_path),
                                     'downloaded_bytes': output_path.stat().st_size if output_path.exists() else 0,
                                     'total_bytes': output_path.stat().st_size if output_path.exists() else 0
                                 }
                                 self.progress_hook_callback(completion_data)
+                            self._submit_validation(str(output_path))
+                            self._settle_storage()
                             return True
                         else:
                             print(f"{Fore.YELLOW}⚠️  Merge failed, falling back...")
@@ -577,29 +1774,30 @@ class YouTubeDownloader:
     
     def _download_standard_mode(self, url: str, quality: str, output_name: Optional[str]) -> bool:
         """Standard mode with combined streams."""
-        print(f"{Fore.CYAN}📥 STANDARD MODE - Reliable Download")
-        print(f"{Fore.CYAN}🎯 Target quality: {quality}")
+        logger.info("📥 STANDARD MODE - Reliable Download")
+        logger.info("🎯 Target quality: %s", quality)
 
         # Check if audio language is specified
         selected_audio_lang = getattr(self, 'audio_language', None)
         if selected_audio_lang:
-            print(f"{Fore.CYAN}🌐 Requested audio language: {selected_audio_lang}")
+            logger.info("🌐 Requested audio language: %s", selected_audio_lang)
 
         # Progressive quality fallback for best success rate
         quality_options = self._get_quality_fallbacks(quality)
 
         # Debug: Log the actual quality selection process
-        print(f"{Fore.CYAN}🔍 DEBUG: Requested quality: {quality}")
-        print(f"{Fore.CYAN}🔍 DEBUG: Quality fallbacks: {', '.join(quality_options[:5])}")
-
-        print(f"{Fore.CYAN}📋 Trying formats: {', '.join(quality_options[:3])}...")
+        logger.debug("Requested quality: %s", quality)
+        if logger.isEnabledFor(logging.INFO):
+            # Only build the joined lists when they will actually be emitted
+            logger.debug("Quality fallbacks: %s", ', '.join(quality_options[:5]))
+            logger.info("📋 Trying formats: %s...", ', '.join(quality_options[:3]))
 
         for attempt, fmt in enumerate(quality_options):
             if self._is_cancelled():
-                print(f"{Fore.YELLOW}⚠️  Download cancelled (standard mode)")
+                logger.warning("⚠️  Download cancelled (standard mode)")
                 return False
             try:
-                print(f"{Fore.YELLOW}🔍 Attempting format: {fmt}")
+                logger.debug("🔍 Attempting format: %s", fmt)
                 
                 # Modify format string to include audio language if specified
                 format_str = fmt
@@ -615,126 +1813,108 @@ class YouTubeDownloader:
                     else:
                         # Try to prefer the selected language in combined format
                         format_str = f"{fmt}[language={selected_audio_lang}]/{fmt}"
-                    print(f"{Fore.CYAN}🌐 Using audio language filter: {selected_audio_lang}")
+                    logger.info("🌐 Using audio language filter: %s", selected_audio_lang)
                 
                 output_template = self._get_output_template(output_name)
                 
+                # Metadata, cover and faststart are applied by a single ffmpeg pass
                 opts = {
                     'format': format_str,
                     'outtmpl': output_template,
                     'writeinfojson': False,
                     'writesubtitles': False,
-                    'embed_metadata': True,
-                    'embed_thumbnail': True,
-                    'addmetadata': True,
-                    'postprocessors': [
-                        {
-                            'key': 'FFmpegMetadata',
-                            'add_metadata': True,
-                        },
-                        {
-                            'key': 'EmbedThumbnail',
-                            'already_have_thumbnail': False,
-                        }
-                    ],
                 }
                 
                 # Add progress hook if available
                 if self.progress_hook_callback:
                     opts['progress_hooks'] = [self._progress_hook]
+                # Validate the final output off the download thread
+                opts['post_hooks'] = [self._output_ready_hook]
                 
                 # Apply error recovery on retries
                 if attempt > 0:
-                    print(f"{Fore.YELLOW}🔄 Retry {attempt + 1} with format: {fmt}")
+                    logger.warning("🔄 Retry %s with format: %s", attempt + 1, fmt)
+                    self.metrics.inc('ytdl_retries_total', help='Download retries', kind='format')
                     opts = self.error_handler.get_robust_options(opts)
                     time.sleep(random.uniform(2, 5))  # Longer delay for better success
                 
                 opts = self._add_cookies_option(opts)
-                if not self._ydl_download_with_ssl_fallback(opts, url):
+                if not self._ydl_download_with_ssl_fallback(opts, url, [SinglePassPostProcessor(self)]):
                     raise Exception('Download failed')
                     
-                print(f"{Fore.GREEN}✅ Download completed successfully with format: {fmt}")
+                logger.info("✅ Download completed successfully with format: %s", fmt)
+                # How far down the fallback list we had to go
+                self.metrics.observe('ytdl_format_fallback_depth', attempt, 'Index of the format selector that succeeded',
+                                     buckets=(0, 1, 2, 3, 5, 8, 13))
                 return True
                 
             except Exception as e:
                 error_msg = str(e)
-                print(f"{Fore.RED}❌ Format {fmt} failed: {error_msg}")
+                logger.error("❌ Format %s failed: %s", fmt, error_msg)
                 
                 if "403" in error_msg or "Forbidden" in error_msg:
-                    print(f"{Fore.YELLOW}🛡️ 403 Forbidden error detected on attempt {attempt + 1}")
+                    logger.warning("🛡️ 403 Forbidden error detected on attempt %s", attempt + 1)
+                    self.metrics.inc('ytdl_http_403_total', help='HTTP 403 responses', stage='standard')
                     
                     # Try 403-specific recovery
                     if attempt < 2:  # Allow 2 more attempts with 403 recovery
                         opts = self.error_handler.handle_403_error(url, opts, attempt)
-                        print(f"{Fore.CYAN}🔄 Retrying with enhanced 403 recovery...")
+                        logger.info("🔄 Retrying with enhanced 403 recovery...")
                         continue
                     else:
-                        print(f"{Fore.RED}❌ 403 error persists after recovery attempts")
+                        logger.error("❌ 403 error persists after recovery attempts")
                         
                 elif "404" in error_msg:
-                    print(f"{Fore.RED}❌ Video not available (404)")
+                    logger.error("❌ Video not available (404)")
                     return False
                 elif "not available" in error_msg.lower():
-                    print(f"{Fore.YELLOW}⚠️  Format not available, trying next...")
+                    logger.warning("⚠️  Format not available, trying next...")
                     continue
                 else:
-                    print(f"{Fore.YELLOW}⚠️  Error: {error_msg}")
+                    logger.warning("⚠️  Error: %s", error_msg)
                     if attempt < len(quality_options) - 1:
                         time.sleep(random.uniform(1, 3))
                         continue
         
-        print(f"{Fore.RED}❌ All download attempts failed")
+        logger.error("❌ All download attempts failed")
         
         # Additional helpful message for format limitations
         if not self.merger.ffmpeg_available:
-            print(f"\n{Fore.YELLOW}💡 Troubleshooting Tips:")
-            print(f"{Fore.YELLOW}   • This video may only have high-quality content in separate streams")
-            print(f"{Fore.YELLOW}   • Install FFmpeg to download the best available quality")
-            print(f"{Fore.YELLOW}   • Try a different video that has combined formats available")
-            print(f"{Fore.YELLOW}   • Use --list-formats to see all available formats")
+            logger.warning("💡 Troubleshooting Tips:")
+            logger.warning("   • This video may only have high-quality content in separate streams")
+            logger.warning("   • Install FFmpeg to download the best available quality")
+            logger.warning("   • Try a different video that has combined formats available")
+            logger.warning("   • Use --list-formats to see all available formats")
         
         return False
     
     def _download_audio_only(self, url: str, output_name: Optional[str]) -> bool:
-        """Download audio only."""
+        """Download audio only, keeping the source codec unless a target codec is requested."""
         print(f"{Fore.GREEN}🎵 Audio-only download")
+        if self.audio_format:
+            print(f"{Fore.CYAN}🎚️  Target audio codec: {self.audio_format}")
         
-        output_template = self._get_output_template(output_name, audio_only=True)
+        output_template = self._get_output_template(output_name)
         
+        # Remux (or transcode on request), metadata and cover happen in a single ffmpeg pass
         opts = {
             'format': 'bestaudio/best',
             'outtmpl': output_template,
             'writeinfojson': False,
-            'embed_metadata': True,
-            'embed_thumbnail': True,
-            'addmetadata': True,
-            'postprocessors': [
-                {
-                    'key': 'FFmpegMetadata',
-                    'add_metadata': True,
-                },
-                {
-                    'key': 'EmbedThumbnail',
-                    'already_have_thumbnail': False,
-                },
-                {
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }
-            ],
         }
         
         # Add progress hook if available
         if self.progress_hook_callback:
             opts['progress_hooks'] = [self._progress_hook]
+        # Validate the final output off the download thread
+        opts['post_hooks'] = [self._output_ready_hook]
         
         opts = self._add_cookies_option(opts)
         try:
             if self._is_cancelled():
                 print(f"{Fore.YELLOW}⚠️  Download cancelled (audio only)")
                 return False
-            if not self._ydl_download_with_ssl_fallback(opts, url):
+            if not self._ydl_download_with_ssl_fallback(opts, url, [SinglePassPostProcessor(self, audio_only=True)]):
                 print(f"{Fore.RED}❌ Audio download failed")
                 return False
             print(f"{Fore.GREEN}✅ Audio download completed")
@@ -743,13 +1923,18 @@ class YouTubeDownloader:
             print(f"{Fore.RED}❌ Audio download failed: {e}")
             return False
     
+    @timed_stage('extract')
     def _get_video_info(self, url: str) -> Optional[Dict]:
         """Get video information with error recovery."""
+        cached = self._cached_info(url)
+        if cached:
+            return cached
         for attempt in range(3):
             try:
                 opts = {'quiet': True, 'no_warnings': True, 'extract_flat': False}
                 
                 if attempt > 0:
+                    self.metrics.inc('ytdl_retries_total', help='Download retries', kind='extract')
                     opts = self.error_handler.get_robust_options(opts)
                     time.sleep(random.uniform(1, 3))
                 
@@ -757,7 +1942,7 @@ class YouTubeDownloader:
                 opts = self._apply_ssl_options(opts)
                 
                 with yt_dlp.YoutubeDL(opts) as ydl:
-                    return ydl.extract_info(url, download=False)
+                    return self._remember_info(url, ydl.extract_info(url, download=False))
                     
             except Exception as e:
                 err_str = str(e)
@@ -765,10 +1950,11 @@ class YouTubeDownloader:
                 # SSL fallback only if not already using insecure mode
                 if self._is_ssl_error(err_str) and not self.insecure_ssl:
                     print(f"{Fore.YELLOW}⚠️  SSL certificate verification failed. Retrying with 'nocheckcertificate'=True.")
+                    self.metrics.inc('ytdl_ssl_fallback_total', help='Retries with certificate checks disabled', stage='extract')
                     try:
                         ssl_opts = {**opts, 'nocheckcertificate': True}
                         with yt_dlp.YoutubeDL(ssl_opts) as ydl:
-                            return ydl.extract_info(url, download=False)
+                            return self._remember_info(url, ydl.extract_info(url, download=False))
                     except Exception as ssl_e:
                         print(f"{Fore.RED}❌ SSL-fallback failed: {ssl_e}")
 
@@ -777,14 +1963,22 @@ class YouTubeDownloader:
                     
         return None
 
-    def _ydl_download_with_ssl_fallback(self, opts: Dict[str, Any], url: str) -> bool:
+    def _ydl_download_with_ssl_fallback(self, opts: Dict[str, Any], url: str,
+                                        post_processors: Optional[List[PostProcessor]] = None,
+                                        stream: str = 'main') -> bool:
         """Run yt-dlp download with SSL-fallback retry (nocheckcertificate=True).
 
+        Extra postprocessor instances are appended after the ones configured in opts.
         Returns True on success, False on failure.
         """
-        try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
+        def run(run_opts: Dict[str, Any]) -> None:
+            with self.metrics.span('download', stream=stream), yt_dlp.YoutubeDL(run_opts) as ydl:
+                for pp in post_processors or []:
+                    ydl.add_post_processor(pp, when='post_process')
                 ydl.download([url])
+
+        try:
+            run(opts)
             return True
         except Exception as e:
             err_str = str(e)
@@ -792,10 +1986,9 @@ class YouTubeDownloader:
             # SSL fallback only if not already using insecure mode
             if self._is_ssl_error(err_str) and not self.insecure_ssl:
                 print(f"{Fore.YELLOW}⚠️  SSL certificate verification failed during download. Retrying with 'nocheckcertificate'=True.")
+                self.metrics.inc('ytdl_ssl_fallback_total', help='Retries with certificate checks disabled', stage='download')
                 try:
-                    ssl_opts = {**opts, 'nocheckcertificate': True}
-                    with yt_dlp.YoutubeDL(ssl_opts) as ydl:
-                        ydl.download([url])
+                    run({**opts, 'nocheckcertificate': True})
                     print(f"{Fore.GREEN}✅ Download succeeded using nocheckcertificate fallback")
                     return True
                 except Exception as ssl_e:
@@ -805,6 +1998,7 @@ class YouTubeDownloader:
                 print(f"{Fore.RED}❌ Download failed: {e}")
                 return False
     
+    @timed_stage('select')
     def _select_formats(self, video_info: Dict, quality: str) -> Tuple[Optional[str], Optional[str]]:
         """Smart format selection for separate streams with better validation."""
         formats = video_info.get('formats', [])
@@ -858,18 +2052,18 @@ class YouTubeDownloader:
         
         # If no explicit separate streams available, try a safe fallback
         if not video_formats or not audio_formats:
-            print(f"{Fore.YELLOW}⚠️  No explicit separate video/audio streams available (filtered)")
-            print(f"{Fore.YELLOW}   Video formats matched: {len(video_formats)}")
-            print(f"{Fore.YELLOW}   Audio formats matched: {len(audio_formats)}")
+            logger.warning("⚠️  No explicit separate video/audio streams available (filtered)")
+            logger.warning("   Video formats matched: %s", len(video_formats))
+            logger.warning("   Audio formats matched: %s", len(audio_formats))
             if selected_audio_lang:
-                print(f"{Fore.YELLOW}   Requested audio language: {selected_audio_lang}")
+                logger.warning("   Requested audio language: %s", selected_audio_lang)
 
             # As a fallback, attempt to use generic selectors that ask yt-dlp to pick
             # the best video and best audio. If an audio language was requested, include it.
             # This allows ULTRA mode to still download separate streams even when our
             # stricter filtering didn't find explicit format entries.
             audio_selector = f"bestaudio[language={selected_audio_lang}]" if selected_audio_lang else "bestaudio"
-            print(f"{Fore.CYAN}🔁 Falling back to generic selectors: bestvideo + {audio_selector}")
+            logger.info("🔁 Falling back to generic selectors: bestvideo + %s", audio_selector)
             return 'bestvideo', audio_selector
         
         # Sort by preference: reliability first, then quality targeting
@@ -894,20 +2088,20 @@ class YouTubeDownloader:
         audio_reliable = audio_format.get('_reliability_score', 0) == 1
         
         if not video_reliable or not audio_reliable:
-            print(f"{Fore.YELLOW}⚠️  Using experimental formats - may be unreliable")
+            logger.warning("⚠️  Using experimental formats - may be unreliable")
             if not video_reliable:
-                print(f"{Fore.YELLOW}   Video format {video_format['format_id']} is experimental")
+                logger.warning("   Video format %s is experimental", video_format['format_id'])
             if not audio_reliable:
-                print(f"{Fore.YELLOW}   Audio format {audio_format['format_id']} is experimental")
-            print(f"{Fore.YELLOW}   Consider using standard mode for better reliability")
+                logger.warning("   Audio format %s is experimental", audio_format['format_id'])
+            logger.warning("   Consider using standard mode for better reliability")
         
-        print(f"{Fore.CYAN}📹 Selected video: {video_format['format_id']} ({video_format.get('height', 'unknown')}p)")
-        print(f"{Fore.CYAN}🎵 Selected audio: {audio_format['format_id']} ({audio_format.get('abr', 'unknown')} kbps)")
+        logger.info("📹 Selected video: %s (%sp)", video_format['format_id'], video_format.get('height', 'unknown'))
+        logger.info("🎵 Selected audio: %s (%s kbps)", audio_format['format_id'], audio_format.get('abr', 'unknown'))
         
         # Log selected audio language if specified
         if selected_audio_lang:
             audio_lang_name = audio_format.get('language_name') or audio_format.get('language') or selected_audio_lang
-            print(f"{Fore.CYAN}🌐 Audio language: {audio_lang_name} ({selected_audio_lang})")
+            logger.info("🌐 Audio language: %s (%s)", audio_lang_name, selected_audio_lang)
         
         return video_format['format_id'], audio_format['format_id']
     
@@ -920,7 +2114,7 @@ class YouTubeDownloader:
         def download_video():
             nonlocal video_file
             try:
-                print(f"{Fore.CYAN}⬇️  Downloading video stream: {video_format}")
+                logger.info("⬇️  Downloading video stream: %s", video_format)
                 opts = self.error_handler.get_robust_options({
                     'format': video_format,
                     'outtmpl': f'{temp_dir}/video.%(ext)s',
@@ -930,36 +2124,37 @@ class YouTubeDownloader:
                     'addmetadata': True,
                 })
                 
-                # Add progress hook if available
+                # Add progress hook if available (tagged so progressive delivery can follow this part)
                 if self.progress_hook_callback:
-                    opts['progress_hooks'] = [self._progress_hook]
+                    opts['progress_hooks'] = [lambda d: self._progress_hook({**d, 'stream': 'video'})]
                 
                 opts = self._add_cookies_option(opts)
-                if not self._ydl_download_with_ssl_fallback(opts, url):
+                if not self._ydl_download_with_ssl_fallback(opts, url, stream='video'):
                     raise Exception('Video stream download failed')
                 
                 video_files = list(Path(temp_dir).glob('video.*'))
                 video_file = str(video_files[0]) if video_files else None
                 
                 if video_file:
-                    print(f"{Fore.GREEN}✅ Video stream downloaded successfully")
+                    logger.info("✅ Video stream downloaded successfully")
                 else:
-                    print(f"{Fore.RED}❌ Video file not found after download")
+                    logger.error("❌ Video file not found after download")
                 
             except Exception as e:
                 error_msg = str(e)
                 if "403" in error_msg or "Forbidden" in error_msg:
-                    print(f"{Fore.RED}🛡️ 403 Forbidden error in video stream download")
-                    print(f"{Fore.YELLOW}💡 Try using standard mode: --mode standard")
+                    logger.error("🛡️ 403 Forbidden error in video stream download")
+                    self.metrics.inc('ytdl_http_403_total', help='HTTP 403 responses', stage='video')
+                    logger.warning("💡 Try using standard mode: --mode standard")
                 elif "not available" in error_msg.lower() or "requested format" in error_msg.lower():
-                    print(f"{Fore.YELLOW}⚠️  Video format {video_format} not available")
+                    logger.warning("⚠️  Video format %s not available", video_format)
                 else:
-                    print(f"{Fore.RED}❌ Video stream failed: {e}")
+                    logger.error("❌ Video stream failed: %s", e)
         
         def download_audio():
             nonlocal audio_file
             try:
-                print(f"{Fore.CYAN}⬇️  Downloading audio stream: {audio_format}")
+                logger.info("⬇️  Downloading audio stream: %s", audio_format)
                 opts = self.error_handler.get_robust_options({
                     'format': audio_format,
                     'outtmpl': f'{temp_dir}/audio.%(ext)s',
@@ -969,66 +2164,164 @@ class YouTubeDownloader:
                     'addmetadata': True,
                 })
                 
-                # Add progress hook if available
+                # Add progress hook if available (tagged so progressive delivery can follow this part)
                 if self.progress_hook_callback:
-                    opts['progress_hooks'] = [self._progress_hook]
+                    opts['progress_hooks'] = [lambda d: self._progress_hook({**d, 'stream': 'audio'})]
                 
                 opts = self._add_cookies_option(opts)
-                if not self._ydl_download_with_ssl_fallback(opts, url):
+                if not self._ydl_download_with_ssl_fallback(opts, url, stream='audio'):
                     raise Exception('Audio stream download failed')
                 
                 audio_files = list(Path(temp_dir).glob('audio.*'))
                 audio_file = str(audio_files[0]) if audio_files else None
                 
                 if audio_file:
-                    print(f"{Fore.GREEN}✅ Audio stream downloaded successfully")
+                    logger.info("✅ Audio stream downloaded successfully")
                 else:
-                    print(f"{Fore.RED}❌ Audio file not found after download")
+                    logger.error("❌ Audio file not found after download")
                 
             except Exception as e:
                 error_msg = str(e)
                 if "403" in error_msg or "Forbidden" in error_msg:
-                    print(f"{Fore.RED}🛡️ 403 Forbidden error in audio stream download")
-                    print(f"{Fore.YELLOW}💡 Try using standard mode: --mode standard")
+                    logger.error("🛡️ 403 Forbidden error in audio stream download")
+                    self.metrics.inc('ytdl_http_403_total', help='HTTP 403 responses', stage='audio')
+                    logger.warning("💡 Try using standard mode: --mode standard")
                 elif "not available" in error_msg.lower() or "requested format" in error_msg.lower():
-                    print(f"{Fore.YELLOW}⚠️  Audio format {audio_format} not available")
+                    logger.warning("⚠️  Audio format %s not available", audio_format)
                 else:
-                    print(f"{Fore.RED}❌ Audio stream failed: {e}")
+                    logger.error("❌ Audio stream failed: %s", e)
         
         # Parallel execution
         with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            video_future = executor.submit(download_video)
-            audio_future = executor.submit(download_audio)
+            video_future = executor.submit(contextvars.copy_context().run, download_video)
+            audio_future = executor.submit(contextvars.copy_context().run, download_audio)
             concurrent.futures.wait([video_future, audio_future])
         
         return video_file, audio_file
     
-    def _merge_with_ytdlp(self, video_path: str, audio_path: str, output_path: str) -> bool:
-        """Fallback merge using FFmpeg directly."""
+    # Containers that can carry an attached cover image / need moov relocation
+    COVER_CONTAINERS = {'.mp4', '.m4a', '.m4v', '.mov', '.mp3'}
+    FASTSTART_CONTAINERS = {'.mp4', '.m4a', '.m4v', '.mov'}
+    MUXER_BY_SUFFIX = {'.mp4': 'mp4', '.m4a': 'ipod', '.m4v': 'mp4', '.mov': 'mov', '.mp3': 'mp3',
+                       '.webm': 'webm', '.mkv': 'matroska', '.mka': 'matroska', '.opus': 'opus',
+                       '.ogg': 'ogg', '.flac': 'flac'}
+    # Native container for each audio codec, so copied streams need no decoding
+    AUDIO_CONTAINERS = {'aac': '.m4a', 'mp4a': '.m4a', 'alac': '.m4a', 'opus': '.opus',
+                        'vorbis': '.ogg', 'mp3': '.mp3', 'flac': '.flac'}
+
+    def _fetch_thumbnail(self, info: Dict[str, Any]) -> Optional[str]:
+        """Return a local thumbnail for embedding, reusing the shared thumbnail cache."""
+        thumb_url = info.get('thumbnail')
+        if not thumb_url:
+            return None
+        cached = self.thumbnails.get(info.get('id'), thumb_url)
+        return str(cached) if cached else None
+
+    def _build_single_pass_cmd(self, inputs: List[str], output: str, info: Dict[str, Any],
+                               thumbnail: Optional[str] = None, container: str = '.mp4',
+                               audio_only: bool = False, audio_encoder: Optional[str] = None,
+                               audio_bitrate: Optional[str] = None) -> List[str]:
+        """Build one ffmpeg command that merges inputs, tags, embeds the cover and applies faststart.
+
+        Streams are copied; only an explicit audio_encoder re-encodes the audio track.
+        """
+        ffmpeg_cmd = getattr(self.merger, 'ffmpeg_path', 'ffmpeg')
+        cmd = [ffmpeg_cmd, '-y', '-hide_banner', '-loglevel', 'error']
+        for path in inputs:
+            cmd += ['-i', path]
+        if thumbnail:
+            cmd += ['-i', thumbnail]
+
+        if audio_only:
+            cmd += ['-map', '0:a:0']
+            cover_index = 0
+        elif len(inputs) == 2:
+            # Separate video + audio streams
+            cmd += ['-map', '0:v:0', '-map', '1:a:0']
+            cover_index = 1
+        else:
+            cmd += ['-map', '0:v?', '-map', '0:a?']
+            cover_index = 1 if info.get('vcodec') not in (None, 'none') else 0
+        cmd += ['-c', 'copy']
+        if audio_encoder:
+            cmd += ['-c:a', audio_encoder]
+            if audio_bitrate and audio_encoder != 'flac':
+                cmd += ['-b:a', audio_bitrate]
+
+        if thumbnail:
+            cmd += ['-map', f'{len(inputs)}:v:0', f'-c:v:{cover_index}', 'mjpeg',
+                    f'-disposition:v:{cover_index}', 'attached_pic']
+            if container == '.mp3':
+                cmd += ['-id3v2_version', '3', f'-metadata:s:v:{cover_index}', 'title=Album cover']
+
+        metadata = {
+            'title': info.get('title'),
+            'artist': info.get('uploader') or info.get('channel'),
+            'date': info.get('upload_date'),
+            'description': info.get('description'),
+            'comment': info.get('webpage_url'),
+        }
+        for key, value in metadata.items():
+            if value:
+                cmd += ['-metadata', f'{key}={value}']
+
+        if container in self.FASTSTART_CONTAINERS:
+            cmd += ['-movflags', '+faststart']
+        muxer = self.MUXER_BY_SUFFIX.get(container)
+        if muxer:
+            cmd += ['-f', muxer]
+        cmd.append(output)
+        return cmd
+
+    def _ffmpeg_single_pass(self, inputs: List[str], output_path: Path, info: Dict[str, Any],
+                            audio_only: bool = False, audio_encoder: Optional[str] = None) -> bool:
+        """Merge/tag/cover/faststart in one ffmpeg run, finalized atomically at output_path."""
+        container = output_path.suffix.lower()
+        thumbnail = None
+        if container in self.COVER_CONTAINERS:
+            thumbnail = self._fetch_thumbnail(info)
+        audio_args = {'audio_only': audio_only, 'audio_encoder': audio_encoder, 'audio_bitrate': self.audio_quality}
         try:
-            
-            # Use the detected FFmpeg path
-            ffmpeg_cmd = getattr(self.merger, 'ffmpeg_path', 'ffmpeg')
-            
-            cmd = [
-                ffmpeg_cmd, '-i', video_path, '-i', audio_path, 
-                '-c:v', 'copy', '-c:a', 'copy', 
-                '-f', 'mp4', output_path, '-y'
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=300)
-            
-            if result.returncode == 0:
-                print(f"{Fore.GREEN}✅ FFmpeg merge successful")
-                return True
-            else:
-                print(f"{Fore.RED}❌ FFmpeg merge failed: {result.stderr}")
-                return False
-                
+            with self.finalizer.staging(output_path) as tmp:
+                cmd = self._build_single_pass_cmd(inputs, str(tmp), info, thumbnail, container, **audio_args)
+                result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=600)
+                if result.returncode != 0 and thumbnail:
+                    # Unusable cover image must not cost us the output
+                    cmd = self._build_single_pass_cmd(inputs, str(tmp), info, None, container, **audio_args)
+                    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=600)
+                if result.returncode != 0:
+                    print(f"{Fore.RED}❌ FFmpeg postprocessing failed: {result.stderr}")
+                    return False
+                replaces = Path(inputs[0]) if len(inputs) == 1 else None
+                self.finalizer.commit(tmp, output_path, replaces=replaces)
+            print(f"{Fore.GREEN}✅ FFmpeg single-pass postprocessing successful")
+            return True
         except Exception as e:
-            print(f"{Fore.RED}❌ FFmpeg merge error: {e}")
+            print(f"{Fore.RED}❌ FFmpeg postprocessing error: {e}")
             return False
     
+    def _finalize_audio(self, path: Path, info: Dict[str, Any]) -> Path:
+        """Remux downloaded audio into its native container, transcoding only on explicit request."""
+        source_codec = (info.get('acodec') or '').split('.')[0].lower()
+        target_codec = (self.audio_format or '').lower()
+        pool = AudioEncoderPool.shared()
+        encoder = None
+        if target_codec and target_codec != source_codec and not (target_codec == 'aac' and source_codec == 'mp4a'):
+            encoder = pool.encoder_for(target_codec)
+            if not encoder:
+                print(f"{Fore.YELLOW}⚠️  Unsupported audio codec '{target_codec}', keeping original stream")
+        codec = target_codec if encoder else source_codec
+        output_path = path.with_suffix(self.AUDIO_CONTAINERS.get(codec, '.mka'))
+
+        if not encoder:
+            print(f"{Fore.CYAN}📦 Keeping original {source_codec or 'audio'} stream ({output_path.suffix})")
+            ok = self._ffmpeg_single_pass([str(path)], output_path, info, audio_only=True)
+        else:
+            print(f"{Fore.CYAN}🎚️  Transcoding {source_codec or 'audio'} → {target_codec} with {encoder}")
+            with pool.slot():
+                ok = self._ffmpeg_single_pass([str(path)], output_path, info, audio_only=True, audio_encoder=encoder)
+        return output_path if ok else path
+
     def _get_quality_fallbacks(self, quality: str) -> List[str]:
         """Get progressive quality fallback options with better high-quality selection."""
         
@@ -1194,9 +2487,9 @@ class YouTubeDownloader:
             'best'
         ])
     
-    def _get_output_template(self, output_name: Optional[str], audio_only: bool = False) -> str:
+    def _get_output_template(self, output_name: Optional[str]) -> str:
         """Generate output template."""
-        ext = "mp3" if audio_only else "%(ext)s"
+        ext = "%(ext)s"
         if output_name:
             safe_name = re.sub(r'[<>:"/\\|?*]', '_', output_name)
             template = str(self.download_path / f"{safe_name}.{ext}")
@@ -1230,6 +2523,14 @@ class YouTubeDownloader:
         print(f"{Fore.GREEN}✅ Intelligent quality fallback")
         print(f"{Fore.GREEN}✅ Pure Python video merging (MoviePy): {'ENABLED' if self.merger.available else 'DISABLED'}")
         print(f"{Fore.GREEN}✅ FFmpeg external merging: {'ENABLED' if self.merger.ffmpeg_available else 'DISABLED'}")
+        if self.merger.ffmpeg_available:
+            toolchain = self.merger.registry.get()
+            hw_encoders = self.merger.registry.hardware_encoders()
+            print(f"{Fore.GREEN}✅ FFmpeg {toolchain.get('version')}: {self.merger.ffmpeg_path}")
+            print(f"{Fore.GREEN}✅ FFprobe: {self.merger.ffprobe_path or 'NOT FOUND'}")
+            print(f"{Fore.GREEN}✅ Encoders: {len(toolchain.get('encoders', []))}, muxers: {len(toolchain.get('muxers', []))}")
+            print(f"{Fore.GREEN}✅ Hardware acceleration: {', '.join(toolchain.get('hwaccels', [])) or 'NONE'}"
+                  f"{' (' + ', '.join(hw_encoders) + ')' if hw_encoders else ''}")
         
         merge_status = "FULL" if self.merger.ffmpeg_available else ("PARTIAL" if self.merger.available else "LIMITED")
         merge_color = Fore.GREEN if merge_status == "FULL" else (Fore.YELLOW if merge_status == "PARTIAL" else Fore.RED)
@@ -1331,14 +2632,22 @@ def main():
     parser.add_argument('-d', '--download-path', default='./downloads', 
                        help='Download directory path')
     parser.add_argument('--audio-only', action='store_true', help='Download audio only')
+    parser.add_argument('--audio-format', default='copy',
+                       choices=['copy'] + sorted(AudioEncoderPool.ENCODERS),
+                       help='Audio codec for --audio-only (default: copy, keeps the original stream)')
     parser.add_argument('--list-formats', action='store_true', 
                        help='List available formats without downloading')
     parser.add_argument('--capabilities', action='store_true', 
                        help='Show downloader capabilities')
+    parser.add_argument('--quiet', action='store_true', help='Only log warnings and errors')
+    parser.add_argument('--log-format', choices=['text', 'json'], help='Log output format (default: text)')
+    parser.add_argument('--log-level', help='Log level for ytdl loggers (default: INFO)')
     
     args = parser.parse_args()
+    configure_logging(args.log_level, args.log_format, args.quiet)
     
     downloader = YouTubeDownloader(args.download_path)
+    downloader.audio_format = None if args.audio_format == 'copy' else args.audio_format
     
     if args.capabilities:
         downloader.print_capabilities()